@@ -0,0 +1,94 @@
+import threading
+from lexer import Lexer
+from parser import Parser, to_parse_tree
+from semantic import SemanticAnalyzer
+
+# Library entry point for embedding the compiler:
+#
+#   from api import compile_sql
+#   result = compile_sql("SELECT a FROM t;", catalog=Catalog.load('schema.catalog'))
+#   if not result.success:
+#       print(result.errors)
+
+PHASES = ('lexer', 'parser', 'semantic')
+
+def phases_through(phases):
+    # The phases to run for a selection: every phase up to the last one
+    # selected, as each needs the output of the one before.
+    if isinstance(phases, str):
+        phases = (phases,)
+    if not phases or any(phase not in PHASES for phase in phases):
+        raise ValueError(f"Expected phases among {', '.join(PHASES)}, got {list(phases)}.")
+    return PHASES[:max(PHASES.index(phase) for phase in phases) + 1]
+
+class CompileResult:
+    # What compile_sql() returns. Outputs of phases that were not run are
+    # None; `errors` and `success` cover the phases that were.
+    __slots__ = ('phases', 'tokens', 'lexer_errors', 'symbols', 'ast', 'parser_errors', 'semantic_errors',
+                 'symbol_table')
+    
+    def __init__(self, phases, tokens, lexer_errors, symbols, ast=None, parser_errors=None, semantic_errors=None,
+                 symbol_table=None):
+        self.phases = phases
+        self.tokens, self.lexer_errors, self.symbols = tokens, lexer_errors, symbols
+        self.ast, self.parser_errors = ast, parser_errors
+        self.semantic_errors, self.symbol_table = semantic_errors, symbol_table
+    
+    @property
+    def errors(self):
+        return [error for errors in (self.lexer_errors, self.parser_errors, self.semantic_errors) if errors
+                for error in errors]
+    
+    @property
+    def success(self):
+        return not self.errors
+    
+    @property
+    def parse_tree(self):
+        return to_parse_tree(self.ast) if self.ast is not None else None
+    
+    def summary(self):
+        return {
+            'lexical_errors': len(self.lexer_errors or ()),
+            'syntax_errors': len(self.parser_errors or ()),
+            'semantic_errors': len(self.semantic_errors or ()),
+            'success': self.success
+        }
+
+class Compiler:
+    # One Lexer, Parser and SemanticAnalyzer, reset for every script instead
+    # of being built anew. Not safe to share between threads; compile_sql()
+    # keeps one per thread.
+    def __init__(self, lexer_mode='table', parser_mode='pratt'):
+        self.lexer = Lexer('', lexer_mode)
+        self.parser = Parser([], parser_mode)
+        self.analyzer = SemanticAnalyzer(None)
+    
+    def compile(self, source, phases=PHASES, catalog=None):
+        phases = PHASES if phases is PHASES else phases_through(phases)
+        lexer = self.lexer
+        lexer.reset(source)
+        tokens = lexer.tokenize()
+        if len(phases) == 1:
+            return CompileResult(phases, tokens, lexer.errors, lexer.symbols)
+        parser = self.parser
+        parser.reset(tokens)
+        ast = parser.parse_ast()
+        if len(phases) == 2:
+            return CompileResult(phases, tokens, lexer.errors, lexer.symbols, ast, parser.errors)
+        analyzer = self.analyzer
+        analyzer.reset(ast, catalog)
+        return CompileResult(phases, tokens, lexer.errors, lexer.symbols, ast, parser.errors, analyzer.analyze(),
+                             analyzer.symbol_table)
+
+local = threading.local()
+
+def compile_sql(source, phases=PHASES, catalog=None):
+    # Lex, parse and check `source` (against the tables of `catalog`, a
+    # catalog.Catalog, if given), running only the phases needed for
+    # `phases`. Each thread reuses one Compiler, whose phase objects reset()
+    # to start over on every script; results share nothing with earlier ones.
+    compiler = getattr(local, 'compiler', None)
+    if compiler is None:
+        compiler = local.compiler = Compiler()
+    return compiler.compile(source, phases, catalog)
@@ -0,0 +1,214 @@
+from operator import attrgetter
+
+class Node:
+    # Typed syntax tree produced by the parser. Every node records the span of
+    # source it was parsed from as (line, col, end_line, end_col): the
+    # positions of its first and last tokens (None if it consumed none).
+    __slots__ = ('span',)
+    
+    def __init_subclass__(cls):
+        # Every __init__ takes the class's slots, then those of its bases, in
+        # order; nodes pickle as that constructor call, which is much cheaper
+        # than the generic protocol for __slots__ classes.
+        names = tuple(name for klass in cls.__mro__ for name in klass.__dict__.get('__slots__', ()))
+        cls.field_values = staticmethod(attrgetter(*names) if len(names) > 1 else lambda node: (getattr(node, names[0]),))
+    
+    def __reduce__(self):
+        return (type(self), self.field_values(self))
+    
+    def __repr__(self):
+        fields = ', '.join(f"{name}={getattr(self, name)!r}" for cls in type(self).__mro__
+                           for name in getattr(cls, '__slots__', ()) if name != 'span')
+        return f"{type(self).__name__}({fields})"
+
+class Query(Node):
+    __slots__ = ('statements',)
+    
+    def __init__(self, statements, span=None):
+        self.statements, self.span = statements, span
+
+class Statement(Node):
+    # `missing` names the expected terminals (as shown in the parse tree) that
+    # were not found, `terminated` whether the closing SEMICOLON was there.
+    __slots__ = ('missing', 'terminated')
+
+class CreateStmt(Statement):
+    __slots__ = ('table', 'columns')
+    
+    def __init__(self, table, columns, missing=(), terminated=True, span=None):
+        self.table, self.columns = table, columns
+        self.missing, self.terminated, self.span = missing, terminated, span
+
+class ColumnDef(Node):
+    __slots__ = ('name', 'data_type')
+    
+    def __init__(self, name, data_type, span=None):
+        self.name, self.data_type, self.span = name, data_type, span
+
+class InsertStmt(Statement):
+    # One entry per value slot in the list; None where a value was missing
+    # (an empty list or a doubled comma).
+    __slots__ = ('table', 'values')
+    
+    def __init__(self, table, values, missing=(), terminated=True, span=None):
+        self.table, self.values = table, values
+        self.missing, self.terminated, self.span = missing, terminated, span
+
+class SelectStmt(Statement):
+    # `columns` is None for SELECT *.
+    __slots__ = ('columns', 'table', 'where')
+    
+    def __init__(self, columns, table, where, missing=(), terminated=True, span=None):
+        self.columns, self.table, self.where = columns, table, where
+        self.missing, self.terminated, self.span = missing, terminated, span
+
+class UpdateStmt(Statement):
+    __slots__ = ('table', 'assignments', 'where')
+    
+    def __init__(self, table, assignments, where, missing=(), terminated=True, span=None):
+        self.table, self.assignments, self.where = table, assignments, where
+        self.missing, self.terminated, self.span = missing, terminated, span
+
+class Assignment(Node):
+    __slots__ = ('column', 'value', 'missing')
+    
+    def __init__(self, column, value, missing=(), span=None):
+        self.column, self.value, self.missing, self.span = column, value, missing, span
+
+class DeleteStmt(Statement):
+    __slots__ = ('table', 'where')
+    
+    def __init__(self, table, where, missing=(), terminated=True, span=None):
+        self.table, self.where = table, where
+        self.missing, self.terminated, self.span = missing, terminated, span
+
+class Identifier(Node):
+    # data_type is the type of the column a reference in an expression names,
+    # filled in by the semantic analyzer (None if unresolved).
+    __slots__ = ('name', 'data_type')
+    
+    def __init__(self, name, data_type=None, span=None):
+        self.name, self.data_type, self.span = name, data_type, span
+
+class Literal(Node):
+    # kind is 'NUMBER' or 'STRING'; value is the lexeme as the lexer produced it.
+    __slots__ = ('kind', 'value')
+    
+    def __init__(self, kind, value, span=None):
+        self.kind, self.value, self.span = kind, value, span
+
+class ErrorExpr(Node):
+    # Placeholder where a factor was expected but not found.
+    __slots__ = ()
+    
+    def __init__(self, span=None):
+        self.span = span
+
+class Paren(Node):
+    __slots__ = ('expr', 'closed')
+    
+    def __init__(self, expr, closed=True, span=None):
+        self.expr, self.closed, self.span = expr, closed, span
+
+class BinaryOp(Node):
+    # op is the operator token type (PLUS, MINUS, MULTIPLY, DIVIDE, MODULO).
+    __slots__ = ('op', 'left', 'right')
+    
+    def __init__(self, op, left, right, span=None):
+        self.op, self.left, self.right, self.span = op, left, right, span
+
+class Comparison(Node):
+    # op is the operator lexeme ('=', '!=', ...), None if it was missing.
+    __slots__ = ('left', 'op', 'right')
+    
+    def __init__(self, left, op, right, span=None):
+        self.left, self.op, self.right, self.span = left, op, right, span
+
+class LogicalOp(Node):
+    # op is 'AND' or 'OR'.
+    __slots__ = ('op', 'left', 'right')
+    
+    def __init__(self, op, left, right, span=None):
+        self.op, self.left, self.right, self.span = op, left, right, span
+
+class Not(Node):
+    # operand is a Comparison, or an Identifier for a bare boolean column.
+    __slots__ = ('operand',)
+    
+    def __init__(self, operand, span=None):
+        self.operand, self.span = operand, span
+
+def children(node):
+    # Child nodes in field order, looking into list fields.
+    for cls in type(node).__mro__:
+        for name in getattr(cls, '__slots__', ()):
+            value = getattr(node, name, None)
+            if isinstance(value, Node):
+                yield value
+            elif isinstance(value, list):
+                yield from (item for item in value if isinstance(item, Node))
+
+def flatten(nodes):
+    # Flat, picklable form of a list of trees: one (class, field values, refs)
+    # entry per node, in preorder, with node fields left None. refs says
+    # where the children go: a field index for a node field, (field index,
+    # item indices) for a list field. Unlike pickling the trees, which
+    # recurses once per level, neither this nor unflatten() has a depth limit.
+    table, stack = [], list(nodes)
+    while stack:
+        node = stack.pop()
+        values, refs = node.field_values(node), None
+        for i, value in enumerate(values):
+            if isinstance(value, Node):
+                if refs is None:
+                    values, refs = list(values), []
+                values[i] = None
+                refs.append(i)
+                stack.append(value)
+            elif isinstance(value, list):
+                items = [k for k, item in enumerate(value) if isinstance(item, Node)]
+                if items:
+                    if refs is None:
+                        values, refs = list(values), []
+                    values[i] = [None if isinstance(item, Node) else item for item in value]
+                    refs.append((i, items))
+                    stack.extend(value[k] for k in items)
+        table.append((type(node), values, refs))
+    return table
+
+def unflatten(table):
+    # The list of trees flatten() was given. In reverse preorder every node
+    # comes right after its subtrees, so its children are the last ones built.
+    built = []
+    for cls, values, refs in reversed(table):
+        if refs:
+            count = sum(1 if type(ref) is int else len(ref[1]) for ref in refs)
+            children = iter(built[-count:])
+            del built[-count:]
+            values = list(values)
+            for ref in refs:
+                if type(ref) is int:
+                    values[ref] = next(children)
+                else:
+                    i, items = ref
+                    value = values[i] = list(values[i])
+                    for k in items:
+                        value[k] = next(children)
+        built.append(cls(*values))
+    return built
+
+ADDITIVE_OPS = ('PLUS', 'MINUS')
+MULTIPLICATIVE_OPS = ('MULTIPLY', 'DIVIDE', 'MODULO')
+
+def chain(node, ops):
+    # Flattens a left-associative chain of `ops` into [operand, op, operand,
+    # ...] left to right: ((a + b) - c) gives [a, 'PLUS', b, 'MINUS', c] for
+    # ADDITIVE_OPS. Works the same for ('AND',) or ('OR',) over LogicalOp.
+    items = []
+    while isinstance(node, (BinaryOp, LogicalOp)) and node.op in ops:
+        items.append(node.right)
+        items.append(node.op)
+        node = node.left
+    items.append(node)
+    items.reverse()
+    return items
@@ -0,0 +1,130 @@
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+from catalog import Catalog
+from compiler import check_source, read_source, set_catalog
+
+# Command-line checker for CI: every file goes through all three phases, on a
+# process pool, and the exit status says whether they all passed.
+#
+#   python batch.py queries/ 'migrations/**/*.sql' --catalog schema.catalog --junit report.xml
+#
+# Exit status: 0 if every file passed, 1 if any failed (or could not be read),
+# 2 for bad arguments, no files, or a schema with errors.
+
+def find_files(patterns):
+    # Files as named, *.sql files under directories (recursively) and glob
+    # matches, in that order, each once.
+    paths = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern, recursive=True)) if glob.has_magic(pattern) else [pattern]
+        for path in matches:
+            if os.path.isdir(path):
+                for root, dirs, files in os.walk(path):
+                    dirs.sort()
+                    paths.extend(os.path.join(root, f) for f in sorted(files) if f.endswith('.sql'))
+            else:
+                paths.append(path)
+    return list(dict.fromkeys(paths))
+
+def check_files(paths):
+    # Entries (see compiler.check_source) for a chunk of files, checked against
+    # the catalog given to set_catalog, with each file's size.
+    entries = []
+    for path in paths:
+        try:
+            size = os.path.getsize(path)
+            entry = check_source(path, read_source(path))
+        except OSError as e:
+            size = 0
+            entry = {'name': path, 'summary': {'lexical_errors': 0, 'syntax_errors': 0, 'semantic_errors': 0, 'success': False},
+                     'errors': {'file': [f"Cannot read {path}: {e.strerror}"]}}
+        entry['bytes'] = size
+        entries.append(entry)
+    return entries
+
+def junit_report(entries, seconds):
+    # One test case per file; a failed file's errors are its failure text.
+    failed = sum(not entry['summary']['success'] for entry in entries)
+    suites = ET.Element('testsuites')
+    suite = ET.SubElement(suites, 'testsuite', name='sql', tests=str(len(entries)), failures=str(failed),
+                          errors='0', time=f"{seconds:.3f}")
+    for entry in entries:
+        case = ET.SubElement(suite, 'testcase', classname='sql', name=entry['name'])
+        if not entry['summary']['success']:
+            errors = [error for phase in entry['errors'].values() for error in phase]
+            failure = ET.SubElement(case, 'failure', message=f"{len(errors)} error(s)")
+            failure.text = '\n'.join(errors)
+    return ET.ElementTree(suites)
+
+def main(argv):
+    arguments = argparse.ArgumentParser(description="Check .sql files with all three compiler phases")
+    arguments.add_argument('paths', nargs='+', help="files, directories (searched for *.sql) or glob patterns")
+    arguments.add_argument('--catalog', help="schema catalog file (see catalog.py)")
+    arguments.add_argument('--schema', help="DDL script every file is checked as if it followed")
+    arguments.add_argument('--workers', type=int, default=os.cpu_count(), help="processes; 0 checks in this process")
+    arguments.add_argument('--chunk-size', type=int, default=0,
+                           help="files per task (default: about four tasks per worker, at most 64 files)")
+    arguments.add_argument('--json', metavar='FILE', help="write a JSON report")
+    arguments.add_argument('--junit', metavar='FILE', help="write a JUnit XML report")
+    arguments.add_argument('-q', '--quiet', action='store_true', help="only print the totals")
+    args = arguments.parse_args(argv[1:])
+    
+    schema = Catalog.load(args.catalog) if args.catalog else None
+    if args.schema:
+        with open(args.schema) as f:
+            schema, errors = Catalog.compile(f.read(), schema)
+        if errors:
+            for error in errors:
+                print(f"{args.schema}: {error}")
+            return 2
+    paths = find_files(args.paths)
+    if not paths:
+        print("No .sql files found")
+        return 2
+    
+    # Files go out in chunks, so a worker pays for one task per chunk rather
+    # than per file while small chunks still keep all workers busy to the end.
+    # Workers read the files themselves.
+    workers = max(0, args.workers)
+    chunk_size = args.chunk_size or max(1, min(64, -(-len(paths) // (4 * max(1, workers)))))
+    chunks = [paths[i:i + chunk_size] for i in range(0, len(paths), chunk_size)]
+    start = time.perf_counter()
+    entries = []
+    executor = ProcessPoolExecutor(workers, initializer=set_catalog, initargs=(schema,)) if workers else None
+    if executor is None:
+        set_catalog(schema)
+    try:
+        for checked in executor.map(check_files, chunks) if executor else map(check_files, chunks):
+            for entry in checked:
+                if not entry['summary']['success'] and not args.quiet:
+                    for errors in entry['errors'].values():
+                        for error in errors:
+                            print(f"{entry['name']}: {error}")
+            entries.extend(checked)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    elapsed = time.perf_counter() - start
+    
+    failed = sum(not entry['summary']['success'] for entry in entries)
+    megabytes = sum(entry['bytes'] for entry in entries) / (1 << 20)
+    summary = {'files': len(entries), 'passed': len(entries) - failed, 'failed': failed, 'seconds': elapsed,
+               'files_per_second': len(entries) / elapsed, 'megabytes_per_second': megabytes / elapsed}
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'files': entries, 'summary': summary}, f)
+    if args.junit:
+        junit_report(entries, elapsed).write(args.junit, encoding='utf-8', xml_declaration=True)
+    print(f"{len(entries)} files ({megabytes:.1f} MB): {summary['passed']} passed, {failed} failed "
+          f"in {elapsed:.2f}s with --workers {workers} "
+          f"({summary['files_per_second']:.0f} files/s, {summary['megabytes_per_second']:.2f} MB/s)")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
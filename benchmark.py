@@ -0,0 +1,326 @@
+import argparse
+import gc
+import hashlib
+import json
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from ast_nodes import children
+from lexer import Lexer
+from parser import Parser, PARSER_MODES, to_parse_tree
+from semantic import SemanticAnalyzer
+from compiler import CompilerHandler, encode_json
+
+# Benchmark suite: generated workloads go through each phase separately
+# (Lexer.tokenize, Parser.parse, SemanticAnalyzer.analyze and encoding the
+# /analyze response), reporting time, tokens/s, nodes/s and peak memory.
+# Results can be saved as JSON and compared with an earlier run; phases that
+# got slower or use more memory than the threshold allows are flagged and
+# the exit status is 1.
+#
+#   python benchmark.py --json before.json
+#   python benchmark.py --compare before.json --threshold 0.1
+#   python benchmark.py --parser-modes [--statements 5000] [--repeats 5]
+
+RESULTS_VERSION = 1
+COLUMN_TYPES = ('INT', 'FLOAT', 'TEXT')
+
+def where_workload(statements):
+    conditions = ["id = 1", "price > 10.5 AND qty < 3", "NOT active", "name = 'x' OR id != 2",
+                  "NOT id = 4 AND (price + 1) * 2 >= qty", "a = 1 AND b = 2 AND c = 3 OR d = 4"]
+    lines = ["CREATE TABLE items (id INT, name TEXT, price FLOAT, qty INT, active INT, a INT, b INT, c INT, d INT);"]
+    for i in range(statements):
+        condition = conditions[i % len(conditions)]
+        if i % 3 == 0:
+            lines.append(f"SELECT id, price * qty FROM items WHERE {condition};")
+        elif i % 3 == 1:
+            lines.append(f"UPDATE items SET qty = qty - 1 WHERE {condition};")
+        else:
+            lines.append(f"DELETE FROM items WHERE {condition};")
+    return '\n'.join(lines)
+
+class Workload:
+    # Generator of synthetic scripts over `tables` tables t0, t1, ... of
+    # `columns` columns c0, c1, ..., typed INT, FLOAT, TEXT in turn. Every
+    # script starts by declaring them; the same seed gives the same script.
+    def __init__(self, statements, tables, columns, depth, string_length, seed):
+        self.statements, self.tables, self.columns = statements, tables, columns
+        self.depth, self.string_length = depth, string_length
+        self.rng = random.Random(seed)
+    
+    def generate(self, kind):
+        lines = [f"CREATE TABLE t{i} ({', '.join(f'c{j} {COLUMN_TYPES[j % 3]}' for j in range(self.columns))});"
+                 for i in range(self.tables)]
+        statement = getattr(self, kind + '_statement')
+        lines.extend(statement(i) for i in range(self.statements))
+        return '\n'.join(lines)
+    
+    def table(self):
+        return f"t{self.rng.randrange(self.tables)}"
+    
+    def column(self, numeric=False):
+        j = self.rng.randrange(self.columns)
+        if numeric and j % 3 == 2:
+            j -= 1
+        return f"c{j}"
+    
+    def value(self, j):
+        kind = COLUMN_TYPES[j % 3]
+        if kind == 'INT':
+            return str(self.rng.randrange(100000))
+        if kind == 'FLOAT':
+            return f"{self.rng.random() * 1000:.2f}"
+        return f"'v{self.rng.randrange(100000)}'"
+    
+    def expression(self, depth):
+        # Arithmetic nested `depth` parentheses deep.
+        if depth == 0:
+            return self.rng.choice([self.column(numeric=True), str(self.rng.randrange(100))])
+        op = self.rng.choice('+-*/%')
+        return f"({self.expression(depth - 1)} {op} {self.column(numeric=True)})"
+    
+    def condition(self, terms, depth):
+        parts = []
+        for k in range(terms):
+            comparison = f"{self.expression(depth)} {self.rng.choice(['=', '!=', '<', '>', '<=', '>='])} {self.rng.randrange(100)}"
+            if self.rng.random() < 0.2:
+                comparison = "NOT " + comparison
+            parts.append(comparison if not k else f"{self.rng.choice(['AND', 'OR'])} {comparison}")
+        return ' '.join(parts)
+    
+    def assignments(self):
+        chosen = sorted(self.rng.sample(range(self.columns), min(3, self.columns)))
+        return ', '.join(f"c{j} = {self.value(j)}" for j in chosen)
+    
+    def mixed_statement(self, i):
+        kind = i % 4
+        if kind == 0:
+            return f"SELECT {self.column()}, {self.column()} FROM {self.table()} WHERE {self.condition(2, 1)};"
+        if kind == 1:
+            return f"INSERT INTO {self.table()} VALUES ({', '.join(self.value(j) for j in range(self.columns))});"
+        if kind == 2:
+            return f"UPDATE {self.table()} SET {self.assignments()} WHERE {self.condition(1, 0)};"
+        return f"DELETE FROM {self.table()} WHERE {self.condition(1, 1)};"
+    
+    def insert_statement(self, i):
+        return f"INSERT INTO {self.table()} VALUES ({', '.join(self.value(j) for j in range(self.columns))});"
+    
+    def where_statement(self, i):
+        # Long AND/OR chains of deeply nested arithmetic.
+        return f"SELECT * FROM {self.table()} WHERE {self.condition(self.depth, self.depth)};"
+    
+    def strings_statement(self, i):
+        values = []
+        for j in range(self.columns):
+            if j % 3 == 2:
+                text = ''.join(self.rng.choice("abcdefgh ijklmnop'") for _ in range(self.string_length))
+                values.append("'" + text.replace("'", "''") + "'")
+            else:
+                values.append(self.value(j))
+        return f"INSERT INTO {self.table()} VALUES ({', '.join(values)});"
+    
+    def comments_statement(self, i):
+        comment = ["-- line comment for statement %d\n", "/* block comment\n   spanning lines %d */ ",
+                   "# hash comment %d\n", "## double hash %d ## "][i % 4] % i
+        return comment + f"SELECT {self.column()} FROM {self.table()} WHERE {self.condition(1, 0)};"
+    
+    def errors_statement(self, i):
+        # Every statement has a lexical, syntax or semantic error; none stops
+        # the parse.
+        table, column = self.table(), self.column()
+        return [
+            f"SELECT {column} from {table};",
+            f"SELECT {column} @ FROM {table} WHERE {column} $ 1;",
+            f"SELECT {column} FROM {table} WHERE {column} > 1",
+            f"SELECT c{self.columns + 1} FROM {table};",
+            f"SELECT {column} FROM missing{i};",
+            f"INSERT INTO {table} VALUES ({self.value(0)});",
+            f"UPDATE {table} SET c0 = 'text' WHERE c0 = 'text';",
+            f"DELETE FROM {table} WHERE {column} = ;",
+        ][i % 8]
+
+WORKLOADS = ('mixed', 'insert', 'where', 'strings', 'comments', 'errors')
+
+def count_nodes(root, get_children):
+    count, stack = 0, [root]
+    while stack:
+        count += 1
+        stack.extend(get_children(stack.pop()))
+    return count
+
+def best_times(functions, repeats):
+    # Runs are interleaved so that drift on a busy machine hits every
+    # contender alike; garbage from the previous run is collected first.
+    times = {name: [] for name in functions}
+    for _ in range(repeats):
+        for name, function in functions.items():
+            gc.collect()
+            start = time.perf_counter()
+            function()
+            times[name].append(time.perf_counter() - start)
+    return {name: min(samples) for name, samples in times.items()}
+
+def peak_memory(function):
+    # Most memory allocated at once while the function runs, in a separate
+    # (slower) run from the timed ones.
+    gc.collect()
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def run_workload(code, repeats):
+    lexer = Lexer(code, mode='table')
+    tokens = lexer.tokenize()
+    parser = Parser(tokens)
+    parser.parse()
+    ast = parser.ast
+    analyzer = SemanticAnalyzer(ast)
+    semantic_errors = analyzer.analyze()
+    
+    def serialize():
+        result = CompilerHandler.build_result(tokens, lexer.errors, lexer.symbols, ast, parser.errors,
+                                              semantic_errors, analyzer)
+        return encode_json(result).encode()
+    
+    phases = {
+        'lex': lambda: Lexer(code, mode='table').tokenize(),
+        'parse': lambda: Parser(tokens).parse(),
+        'analyze': lambda: SemanticAnalyzer(ast).analyze(),
+        'serialize': serialize,
+    }
+    seconds = best_times(phases, repeats)
+    nodes = count_nodes(ast, children)
+    entry = {
+        'source_sha256': hashlib.sha256(code.encode()).hexdigest(),
+        'source_bytes': len(code.encode()),
+        'tokens': len(tokens),
+        'nodes': nodes,
+        'output_bytes': len(serialize()),
+        'errors': {'lexer': len(lexer.errors), 'parser': len(parser.errors), 'semantic': len(semantic_errors)},
+        'phases': {},
+    }
+    for name, function in phases.items():
+        entry['phases'][name] = {
+            'seconds': seconds[name],
+            'tokens_per_second': len(tokens) / seconds[name],
+            'nodes_per_second': nodes / seconds[name],
+            'peak_bytes': peak_memory(function),
+        }
+    return entry
+
+def print_workload(name, entry):
+    errors = entry['errors']
+    print(f"{name}: {entry['source_bytes'] / 1024:.0f} kB, {entry['tokens']} tokens, {entry['nodes']} nodes, "
+          f"{errors['lexer']}/{errors['parser']}/{errors['semantic']} lexical/syntax/semantic errors, "
+          f"{entry['output_bytes'] / 1024:.0f} kB response")
+    for phase, stats in entry['phases'].items():
+        print(f"  {phase:<10} {stats['seconds'] * 1000:9.1f} ms  {stats['tokens_per_second'] / 1e6:6.2f} M tokens/s  "
+              f"{stats['nodes_per_second'] / 1e6:6.2f} M nodes/s  peak {stats['peak_bytes'] / (1 << 20):7.1f} MB")
+
+def compare(results, baseline, threshold):
+    # Phase by phase against a baseline run of the same workloads (same
+    # generated source); returns the regressions: time or peak memory up by
+    # more than `threshold`.
+    regressions = []
+    print(f"Compared with {baseline.get('timestamp', 'baseline')} (threshold {threshold:.0%}):")
+    for name, entry in results['workloads'].items():
+        before = baseline.get('workloads', {}).get(name)
+        if before is None:
+            print(f"  {name}: not in the baseline")
+            continue
+        if before['source_sha256'] != entry['source_sha256']:
+            print(f"  {name}: generated from other parameters than the baseline, skipped")
+            continue
+        for phase, stats in entry['phases'].items():
+            old = before['phases'].get(phase)
+            if old is None:
+                continue
+            changes, flag = [], ""
+            for metric, label in (('seconds', 'time'), ('peak_bytes', 'memory')):
+                change = stats[metric] / old[metric] - 1 if old[metric] else 0.0
+                changes.append(f"{label} {change:+.1%}")
+                if change > threshold:
+                    regressions.append((name, phase, label, change))
+                    flag = "  REGRESSION"
+            print(f"  {name:<9} {phase:<10} {stats['seconds'] * 1000:9.1f} ms (was {old['seconds'] * 1000:.1f})  "
+                  f"{', '.join(changes)}{flag}")
+    return regressions
+
+def compare_parser_modes(statements, repeats):
+    # Size of the typed tree against its ParseNode rendering and the parse
+    # time of each parser mode, on a WHERE-heavy workload.
+    tokens = Lexer(where_workload(statements), mode='table').tokenize()
+    
+    parser = Parser(tokens)
+    ast = parser.parse_ast()
+    parse_nodes = count_nodes(to_parse_tree(ast), lambda node: node.children)
+    ast_nodes = count_nodes(ast, children)
+    print(f"{statements} statements, {len(tokens)} tokens")
+    print(f"  ParseNode tree: {parse_nodes} nodes")
+    print(f"  typed tree:     {ast_nodes} nodes ({100 * (1 - ast_nodes / parse_nodes):.0f}% fewer)")
+    
+    functions = {mode: (lambda mode=mode: Parser(tokens, mode=mode).parse_ast()) for mode in PARSER_MODES}
+    functions['descent+ParseNode'] = lambda: Parser(tokens, mode='descent').parse()
+    results = best_times(functions, repeats)
+    for name, seconds in results.items():
+        print(f"  {name:<18} {seconds * 1000:8.1f} ms  {len(tokens) / seconds / 1e6:6.2f} M tokens/s")
+    print(f"  pratt vs descent: {100 * (1 - results['pratt'] / results['descent']):.0f}% less parse time")
+
+def main(argv):
+    arguments = argparse.ArgumentParser(description="Per-phase compiler benchmark on generated workloads")
+    arguments.add_argument('--workloads', default=','.join(WORKLOADS),
+                           help=f"comma-separated, from {', '.join(WORKLOADS)} (default: all)")
+    arguments.add_argument('--statements', type=int, default=2000, help="statements per workload, after the CREATEs")
+    arguments.add_argument('--tables', type=int, default=20)
+    arguments.add_argument('--columns', type=int, default=8)
+    arguments.add_argument('--depth', type=int, default=4, help="nesting and chain length in the 'where' workload")
+    arguments.add_argument('--string-length', type=int, default=200, help="of string literals in 'strings'")
+    arguments.add_argument('--seed', type=int, default=1)
+    arguments.add_argument('--repeats', type=int, default=5, help="timed runs per phase; the best one counts")
+    arguments.add_argument('--json', metavar='FILE', help="save the results")
+    arguments.add_argument('--compare', metavar='FILE', help="flag regressions against saved results")
+    arguments.add_argument('--threshold', type=float, default=0.10, help="allowed slowdown or memory growth")
+    arguments.add_argument('--parser-modes', action='store_true', help="compare the parser modes instead")
+    args = arguments.parse_args(argv[1:])
+    if args.parser_modes:
+        compare_parser_modes(args.statements, args.repeats)
+        return 0
+    
+    kinds = [kind for kind in args.workloads.split(',') if kind]
+    unknown = [kind for kind in kinds if kind not in WORKLOADS]
+    if unknown or not kinds:
+        arguments.error(f"unknown workloads {', '.join(unknown)}; expected some of {', '.join(WORKLOADS)}")
+    config = {name: getattr(args, name) for name in ('statements', 'tables', 'columns', 'depth', 'string_length',
+                                                    'seed', 'repeats')}
+    results = {
+        'version': RESULTS_VERSION,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'config': config,
+        'workloads': {},
+    }
+    for kind in kinds:
+        workload = Workload(args.statements, args.tables, args.columns, args.depth, args.string_length, args.seed)
+        entry = results['workloads'][kind] = run_workload(workload.generate(kind), args.repeats)
+        print_workload(kind, entry)
+    
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regression(s)")
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,69 @@
+import pickle
+import struct
+import sys
+from lexer import Lexer
+from parser import Parser
+from semantic import SemanticAnalyzer
+
+# A catalog file is a header (magic bytes, then the format version as a
+# little-endian unsigned short) followed by the pickled tables and column
+# index. Files of another version are refused rather than guessed at.
+MAGIC = b'SQLCAT\0'
+VERSION = 1
+HEADER = struct.Struct('<7sH')
+
+class Catalog:
+    # Table definitions compiled from DDL, in the form of
+    # SemanticAnalyzer.symbol_table and column_index. SemanticAnalyzer(tree,
+    # catalog) starts from them without copying, so they must not be changed.
+    def __init__(self, tables=None, column_index=None):
+        self.tables = tables if tables is not None else {}
+        self.column_index = column_index if column_index is not None else {}
+    
+    @classmethod
+    def compile(cls, code, base=None):
+        # (catalog, errors) for a DDL script, on top of the tables of `base`
+        # if given; errors of all three phases, in order. Tables that were
+        # declared make it into the catalog anyway.
+        lexer = Lexer(code, mode='table')
+        parser = Parser(lexer.tokenize(), mode='pratt')
+        analyzer = SemanticAnalyzer(parser.parse_ast(), base)
+        errors = lexer.errors + parser.errors + analyzer.analyze()
+        return cls(analyzer.symbol_table, analyzer.column_index), errors
+    
+    def save(self, path):
+        with open(path, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, VERSION))
+            pickle.dump((self.tables, self.column_index), f, pickle.HIGHEST_PROTOCOL)
+    
+    @classmethod
+    def load(cls, path):
+        # Catalog files are unpickled, so only load ones you created.
+        with open(path, 'rb') as f:
+            header = f.read(HEADER.size)
+            if len(header) < HEADER.size or HEADER.unpack(header)[0] != MAGIC:
+                raise ValueError(f"{path} is not a catalog file")
+            version = HEADER.unpack(header)[1]
+            if version != VERSION:
+                raise ValueError(f"{path} has catalog format version {version}, expected {VERSION}; recompile it")
+            tables, column_index = pickle.load(f)
+        return cls(tables, column_index)
+
+def main(argv):
+    # python catalog.py schema.sql schema.catalog: compiles the DDL once; the
+    # catalog file is only written if it had no errors.
+    if len(argv) != 3:
+        print("usage: python catalog.py schema.sql schema.catalog")
+        return 2
+    with open(argv[1]) as f:
+        catalog, errors = Catalog.compile(f.read())
+    for error in errors:
+        print(error)
+    if errors:
+        return 1
+    catalog.save(argv[2])
+    print(f"{len(catalog.tables)} tables written to {argv[2]}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
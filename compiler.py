@@ -1,32 +1,515 @@
+import argparse
+import gzip
 import http.server
-import socketserver
 import json
+import mmap
+import multiprocessing
+import threading
 import urllib.parse
 from lexer import Lexer
-from parser import Parser
+from parser import Parser, to_parse_tree
 from semantic import SemanticAnalyzer
+from incremental import IncrementalCompiler
+from parallel import iter_chunks, compile_text
+from ast_nodes import Query, CreateStmt
+from catalog import Catalog
+from cache import LRUCache, content_key
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 import os
+import sys
 
 PORT = 8080
+MAX_DOCUMENTS = 32
+# Larger scripts sent with a document id are analyzed on the pool as a whole
+# rather than incrementally in the request thread.
+DOCUMENT_MAX_CHARS = 1 << 18
+# Size caps for the text dumps sent to the web UI, which shows them whole.
+TREE_MAX_DEPTH = 100
+TREE_MAX_NODES = 20000
+DUMP_MAX_TABLES = 1000
+# Fields of an /analyze result, by phase. A request may ask for a subset with
+# "fields": ["summary", "lexer.errors", "semantic", ...] (see select_fields).
+RESULT_FIELDS = {
+    'lexer': ('errors', 'tokens', 'symbols', 'token_count', 'identifier_count'),
+    'parser': ('errors', 'tree'),
+    'semantic': ('errors', 'symbol_table', 'symbol_table_dump', 'annotated_tree'),
+    'summary': (),
+}
+# Responses at least this large are gzipped for clients that accept it.
+GZIP_MIN_BYTES = 1024
+GZIP_LEVEL = 6
+# Most source lines an /analyze_file viewport may ask for.
+VIEWPORT_MAX_LINES = 10000
+
+# Incremental analysis state per open editor buffer (see Document), least
+# recently used first. The lock is only held to look documents up or add
+# them; each has its own lock for analyzing it.
+documents = OrderedDict()
+documents_lock = threading.Lock()
+# Tables every script is checked against, loaded at startup (see catalog.py).
+catalog = None
+
+# Part of every result cache key; bump it whenever the output for a given
+# source changes. The catalog is fixed for the life of the process.
+COMPILER_VERSION = 1
+RESULT_CACHE_BUDGET = 64 << 20
+SEGMENT_CACHE_BUDGET = 64 << 20
+# Encoded /analyze responses by content, and lexed and parsed statements by
+# their text, shared by every document and by statement-granular requests.
+results = LRUCache(RESULT_CACHE_BUDGET)
+segments = LRUCache(SEGMENT_CACHE_BUDGET)
+
+# Analyses queued or running at once before requests are turned away.
+MAX_PENDING = 32
+WORKER_DIED = "The analysis worker stopped (out of memory?); the script was not analyzed."
+
+def set_catalog(loaded):
+    global catalog
+    catalog = loaded
+
+def select_fields(names=None):
+    # {phase: (field, ...)} in RESULT_FIELDS order for a list of "phase" (all
+    # its fields) and "phase.field" names; all fields if none are given.
+    if names is None:
+        return RESULT_FIELDS
+    if not isinstance(names, list) or not all(isinstance(name, str) for name in names):
+        raise ValueError("Expected 'fields': [\"phase\" or \"phase.field\", ...].")
+    for name in names:
+        phase, _, field = name.partition('.')
+        if phase not in RESULT_FIELDS or (field and field not in RESULT_FIELDS[phase]):
+            raise ValueError(f"Unknown field '{name}'.")
+    wanted = set(names)
+    selected = {}
+    for phase, fields in RESULT_FIELDS.items():
+        chosen = fields if phase in wanted else tuple(field for field in fields if f'{phase}.{field}' in wanted)
+        if phase in wanted or chosen:
+            selected[phase] = chosen
+    return selected
+
+def result_options(data):
+    # (fields, tree_format) asked for in an /analyze or /analyze_file request:
+    # optional "fields" (see select_fields) and "tree": "flat" (see
+    # tree_to_table) shrink the response.
+    fields = select_fields(data.get('fields'))
+    tree_format = data.get('tree', 'nested')
+    if tree_format not in ('nested', 'flat'):
+        raise ValueError("Expected 'tree': 'nested' or 'flat'.")
+    return fields, tree_format
+
+def check_document_request(data, code_length=None):
+    # Raises ValueError for an incremental /analyze request with code that is
+    # not a string or a malformed edit, and, given the length of the
+    # document's code, for an edit range outside it.
+    edit = data.get('edit')
+    if not isinstance(data.get('code', ''), str):
+        raise ValueError("Expected 'code': a string.")
+    if edit is not None and not (isinstance(edit, dict) and type(edit.get('start')) is int
+                                 and type(edit.get('end')) is int and isinstance(edit.get('text', ''), str)):
+        raise ValueError("Expected 'edit': {'start': int, 'end': int, 'text': string}.")
+    if edit is not None and code_length is not None and not 0 <= edit['start'] <= edit['end'] <= code_length:
+        raise ValueError(f"Expected an edit range within 0..{code_length}, got {edit['start']}..{edit['end']}.")
+
+def encode_body(result, compress=False):
+    # (body, Content-Encoding or None) of a JSON response.
+    body = encode_json(result).encode()
+    if compress and len(body) >= GZIP_MIN_BYTES:
+        return gzip.compress(body, GZIP_LEVEL, mtime=0), 'gzip'
+    return body, None
+
+def analyze_source(source_code, by_statement=False, fields=RESULT_FIELDS, tree_format='nested', compress=False):
+    # Encoded /analyze response, as produced in pool workers.
+    return encode_body(CompilerHandler.analyze_code(source_code, by_statement, fields, tree_format), compress)
+
+def read_source(path):
+    # Text of a script, decoded straight from a read-only memory map so that
+    # no bytes copy of the file is made. Bytes that are not UTF-8 come out
+    # as U+FFFD.
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return ''
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return str(mapped, 'utf-8', 'replace')
+
+def source_viewport(source_code, line, count):
+    # Lines line .. line + count - 1 (1-based) of a script, and how many
+    # lines it has. A viewport past the last line is empty; neither loop
+    # goes on past the end of the text, however large line and count are.
+    line_count = source_code.count('\n') + 1
+    if line > line_count:
+        return {'line': line, 'text': '', 'line_count': line_count}
+    offset = 0
+    for _ in range(line - 1):
+        offset = source_code.find('\n', offset) + 1
+    start = offset
+    for _ in range(count):
+        offset = source_code.find('\n', offset) + 1 or len(source_code)
+        if offset == len(source_code):
+            break
+    return {'line': line, 'text': source_code[start:offset], 'line_count': line_count}
+
+def analyze_path(path, fields=RESULT_FIELDS, tree_format='nested', compress=False, viewport=None):
+    # Encoded /analyze_file response, as produced in pool workers. The file
+    # is read there, so its text is never sent to the worker or held by the
+    # request thread.
+    source_code = read_source(path)
+    result = CompilerHandler.analyze_code(source_code, False, fields, tree_format)
+    if viewport:
+        result['source'] = source_viewport(source_code, *viewport)
+    return encode_body(result, compress)
+
+def check_source(name, source_code, schema=None, details='errors', tree_format='nested'):
+    # /analyze_batch entry for one file: the summary, plus its errors (or the
+    # whole /analyze result with details='full') if it failed. Files are
+    # checked against `schema` (a Catalog) instead of the server catalog if
+    # one is given.
+    lexer = Lexer(source_code, mode='table')
+    tokens = lexer.tokenize()
+    parser = Parser(tokens, mode='pratt')
+    ast = parser.parse_ast()
+    semantic = SemanticAnalyzer(ast, schema or catalog)
+    semantic_errors = semantic.analyze()
+    
+    summary = CompilerHandler.summarize(lexer.errors, parser.errors, semantic_errors)
+    entry = {'name': name, 'summary': summary}
+    if not summary['success'] and details == 'full':
+        entry['result'] = CompilerHandler.build_result(tokens, lexer.errors, lexer.symbols, ast,
+                                                       parser.errors, semantic_errors, semantic,
+                                                       tree_format=tree_format)
+    elif not summary['success']:
+        entry['errors'] = {'lexer': lexer.errors, 'parser': parser.errors, 'semantic': semantic_errors}
+    return entry
+
+def check_sources(files, schema=None, details='errors', tree_format='nested'):
+    return [check_source(name, source_code, schema, details, tree_format) for name, source_code in files]
+
+def iter_stream_result(source_code):
+    # /analyze_stream lines: one per ';'-terminated piece of the script as soon
+    # as it is lexed, parsed and checked, with its tokens, statement subtrees
+    # and errors (positions are absolute). Pieces are found as they are taken
+    # and dropped once sent; only the symbol tables and the statements that
+    # must wait for later declarations (forward references, no table) are
+    # kept, the latter to be checked at the end. Their errors come in a
+    # "deferred" line each after the last piece, where /analyze has them at
+    # their statement's place; /analyze also lists CREATE TABLE errors before
+    # all others. A closing line has the totals and tables.
+    analyzer = SemanticAnalyzer(None, catalog)
+    symbols, deferred, halted = {}, [], False
+    counts = {'lexical_errors': 0, 'syntax_errors': 0, 'semantic_errors': 0}
+    for index, (start, end, line, col) in enumerate(iter_chunks(source_code, 1)):
+        if halted:
+            # Parsing stops at the first token that cannot start a statement,
+            # as in Parser.parse(); the rest is only lexed.
+            lexer = Lexer(source_code[start:end], mode='table', line=line, col=col)
+            tokens, lexer_errors, chunk_symbols, statements, parser_errors = lexer.tokenize(), lexer.errors, lexer.symbols, [], []
+        else:
+            tokens, lexer_errors, chunk_symbols, statements, parser_errors, halted, _ = compile_text(source_code, start, end, line, col)
+        for name, info in chunk_symbols.items():
+            if name in symbols:
+                symbols[name]['count'] += info['count']
+            else:
+                symbols[name] = info
+        
+        semantic_errors = analyzer.errors = []
+        for stmt in statements:
+            kind = type(stmt)
+            if kind is CreateStmt:
+                analyzer.declare_tables(stmt)
+            elif kind in SemanticAnalyzer.CHECKS:
+                # Same rule as SemanticAnalyzer.analyze(): statements without
+                # a table, or naming one not declared yet, wait for the end.
+                table_name = SemanticAnalyzer.CHECKS[kind][0](stmt)
+                if table_name and table_name in analyzer.symbol_table:
+                    analyzer.check_statement(stmt)
+                else:
+                    deferred.append((index, stmt))
+        
+        counts['lexical_errors'] += len(lexer_errors)
+        counts['syntax_errors'] += len(parser_errors)
+        counts['semantic_errors'] += len(semantic_errors)
+        trees = to_parse_tree(Query(statements)).children
+        yield {'statement': index, 'tokens': tokens, 'tree': [CompilerHandler.tree_to_dict(tree) for tree in trees],
+               'errors': {'lexer': lexer_errors, 'parser': parser_errors, 'semantic': semantic_errors}}
+    
+    for index, stmt in deferred:
+        semantic_errors = analyzer.errors = []
+        analyzer.check_statement(stmt)
+        counts['semantic_errors'] += len(semantic_errors)
+        if semantic_errors:
+            yield {'statement': index, 'deferred': True, 'errors': {'semantic': semantic_errors}}
+    
+    counts['success'] = not any(counts.values())
+    yield {'summary': counts, 'symbols': symbols, 'symbol_table': analyzer.symbol_table}
+
+class AnalysisPool:
+    # Runs analyses on a process pool, or in the calling thread with no
+    # workers. At most max_pending are admitted at a time; run() returns None
+    # for any beyond that instead of letting the queue grow. Workers are
+    # spawned rather than forked, since forking a threaded server could copy
+    # a lock some request thread holds. If a worker dies (killed for memory,
+    # say), the analyses on the pool raise BrokenProcessPool and the next ones
+    # get a new one.
+    def __init__(self, workers=0, max_pending=MAX_PENDING):
+        self.executor = None
+        self.workers = workers
+        self.executor_lock = threading.Lock()
+        if workers:
+            self.executor = self.new_executor()
+        self.slots = threading.BoundedSemaphore(max_pending)
+    
+    def new_executor(self):
+        return ProcessPoolExecutor(self.workers, multiprocessing.get_context('spawn'),
+                                   initializer=set_catalog, initargs=(catalog,))
+    
+    def replace_executor(self, broken):
+        # Once per broken executor, whichever of its analyses gets here first.
+        with self.executor_lock:
+            if self.executor is broken:
+                broken.shutdown(wait=False, cancel_futures=True)
+                self.executor = self.new_executor()
+    
+    def run(self, function, *args):
+        if not self.slots.acquire(blocking=False):
+            return None
+        try:
+            executor = self.executor
+            if executor is None:
+                return function(*args)
+            try:
+                return executor.submit(function, *args).result()
+            except BrokenProcessPool:
+                self.replace_executor(executor)
+                raise
+        finally:
+            self.slots.release()
+    
+    def map(self, function, *iterables):
+        # A list of function's results over the iterables, spread over the
+        # workers; the whole batch takes a single slot.
+        if not self.slots.acquire(blocking=False):
+            return None
+        try:
+            executor = self.executor
+            if executor is None:
+                return list(map(function, *iterables))
+            try:
+                return list(executor.map(function, *iterables))
+            except BrokenProcessPool:
+                self.replace_executor(executor)
+                raise
+        finally:
+            self.slots.release()
+    
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+
+pool = AnalysisPool()
+
+class Document:
+    # An editor buffer's IncrementalCompiler (None until its code was sent)
+    # and the lock held while it is updated and its result built. A request
+    # that fails drops the compiler; the next one must send the full code.
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.compiler = None
+
+def get_document(document_id, create):
+    # The Document for an editor buffer, added if `create` (evicting the least
+    # recently used beyond MAX_DOCUMENTS); None if unknown and not created.
+    with documents_lock:
+        document = documents.get(document_id)
+        if document is not None:
+            documents.move_to_end(document_id)
+        elif create:
+            document = documents[document_id] = Document()
+            while len(documents) > MAX_DOCUMENTS:
+                documents.popitem(last=False)
+        return document
+
+class StaticAsset:
+    # A GET response encoded once: the body, its gzipped form if it is large
+    # enough to be worth it, and an ETag for each.
+    def __init__(self, content_type, text):
+        self.content_type = content_type
+        self.body = text.encode()
+        self.gzipped = gzip.compress(self.body, 9, mtime=0) if len(self.body) >= GZIP_MIN_BYTES else None
+        digest = content_key(text)[:20]
+        self.etag, self.gzip_etag = f'"{digest}"', f'"{digest}-gzip"'
+
+# The .sql files offered by the web UI, as (directory mtime, StaticAsset);
+# listed again only once the directory has changed.
+file_listing = (None, None)
+
+def sql_file_listing():
+    global file_listing
+    mtime = os.stat('.').st_mtime_ns
+    listed_mtime, listing = file_listing
+    if mtime != listed_mtime:
+        files = [f for f in os.listdir('.') if f.endswith('.sql')]
+        listing = StaticAsset('application/json', json.dumps(files))
+        file_listing = (mtime, listing)
+    return listing
+
+class RawJSON(str):
+    pass
+
+def encode_json(value):
+    # json.dumps, falling back to an explicit-stack encoder for parse trees
+    # nested deeper than the C encoder's recursion limit. Same output.
+    try:
+        return json.dumps(value)
+    except RecursionError:
+        pass
+    parts, stack = [], [value]
+    while stack:
+        item = stack.pop()
+        if type(item) is RawJSON:
+            parts.append(item)
+        elif isinstance(item, dict):
+            pending = [RawJSON('{')]
+            for i, (key, child) in enumerate(item.items()):
+                pending.append(RawJSON((', ' if i else '') + json.dumps(str(key)) + ': '))
+                pending.append(child)
+            pending.append(RawJSON('}'))
+            stack.extend(reversed(pending))
+        elif isinstance(item, (list, tuple)):
+            pending = [RawJSON('[')]
+            for i, child in enumerate(item):
+                if i:
+                    pending.append(RawJSON(', '))
+                pending.append(child)
+            pending.append(RawJSON(']'))
+            stack.extend(reversed(pending))
+        else:
+            parts.append(json.dumps(item))
+    return ''.join(parts)
 
 class CompilerHandler(http.server.SimpleHTTPRequestHandler):
-    def do_GET(self):
-        if self.path == '/' or self.path == '/index.html':
-            self.send_response(200)
-            self.send_header('Content-type', 'text/html')
-            self.end_headers()
-            self.wfile.write(self.get_html().encode())
-        elif self.path == '/style.css':
-            self.send_response(200)
-            self.send_header('Content-type', 'text/css')
+    # HTTP/1.1 keeps connections open between requests, so every response
+    # must carry a Content-Length (see send_body). Headers and body are
+    # separate writes; without TCP_NODELAY the body would wait for the
+    # client's delayed ACK on a kept-alive connection.
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    
+    def send_body(self, status, content_type, body, headers=()):
+        self.send_response(status)
+        self.send_header('Content-type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def accepts_gzip(self):
+        # Accept-Encoding lists gzip, without q=0.
+        for coding in self.headers.get('Accept-Encoding', '').replace(' ', '').lower().split(','):
+            name, _, q = coding.partition(';q=')
+            if name == 'gzip':
+                try:
+                    return float(q or 1) > 0
+                except ValueError:
+                    return False
+        return False
+    
+    def send_asset(self, asset):
+        # Browsers revalidate on every use (no-cache) and get a 304 while the
+        # ETag they hold is that of the encoding this request gets.
+        compress = asset.gzipped is not None and self.accepts_gzip()
+        etag = asset.gzip_etag if compress else asset.etag
+        headers = [('ETag', etag), ('Cache-Control', 'no-cache'), ('Vary', 'Accept-Encoding')]
+        tags = [tag.strip().removeprefix('W/') for tag in self.headers.get('If-None-Match', '').split(',')]
+        if '*' in tags or etag in tags:
+            self.send_response(304)
+            for name, value in headers:
+                self.send_header(name, value)
             self.end_headers()
-            self.wfile.write(self.get_css().encode())
+            return
+        if compress:
+            headers.append(('Content-Encoding', 'gzip'))
+        self.send_body(200, asset.content_type, asset.gzipped if compress else asset.body, headers)
+    
+    def send_analysis(self, key, function, *args):
+        # The cached response for key or else function(*args) run on the pool,
+        # which is cached; 503 if the pool is full, 500 if its worker died.
+        encoded, cache_status = results.get(key), 'HIT'
+        if encoded is None:
+            try:
+                encoded, cache_status = pool.run(function, *args), 'MISS'
+            except BrokenProcessPool:
+                self.send_body(500, 'application/json', json.dumps({'error': WORKER_DIED}).encode())
+                return
+            if encoded is None:
+                self.send_body(503, 'application/json', json.dumps({'error': "Server busy, retry later."}).encode(),
+                               [('Retry-After', '1')])
+                return
+            results.put(key, encoded, len(encoded[0]))
+        self.send_encoded(encoded, cache_status)
+    
+    def send_document_analysis(self, data, fields, tree_format, compress):
+        # Incremental /analyze of an editor buffer, in this thread. Requests
+        # for one document wait for each other, those for different documents
+        # do not; each takes an analysis slot, so 503 once --max-pending are
+        # running. Code over DOCUMENT_MAX_CHARS is analyzed on the pool as a
+        # whole instead, and the document forgotten.
+        document_id, source_code = data['document'], data.get('code')
+        try:
+            if not isinstance(document_id, str):
+                raise ValueError("Expected 'document': a string id.")
+            check_document_request(data)
+        except ValueError as e:
+            self.send_body(400, 'application/json', json.dumps({'error': str(e)}).encode())
+            return
+        if source_code is not None and len(source_code) > DOCUMENT_MAX_CHARS:
+            with documents_lock:
+                documents.pop(document_id, None)
+            key = content_key(source_code, COMPILER_VERSION, TREE_MAX_DEPTH, TREE_MAX_NODES, DUMP_MAX_TABLES,
+                              fields, tree_format, compress)
+            self.send_analysis(key, analyze_source, source_code, False, fields, tree_format, compress)
+            return
+        
+        document, encoded, busy, error = get_document(document_id, 'code' in data), None, False, None
+        if document is not None:
+            with document.lock:
+                busy = not pool.slots.acquire(blocking=False)
+                if not busy:
+                    try:
+                        result = self.analyze_document(document, data, fields, tree_format)
+                        encoded = encode_body(result, compress) if result is not None else None
+                    except ValueError as e:
+                        error = str(e)
+                    finally:
+                        pool.slots.release()
+        if error:
+            self.send_body(400, 'application/json', json.dumps({'error': error}).encode())
+        elif busy:
+            self.send_body(503, 'application/json', json.dumps({'error': "Server busy, retry later."}).encode(),
+                           [('Retry-After', '1')])
+        elif encoded is None:
+            self.send_body(404, 'application/json', json.dumps({'error': f"Unknown document '{document_id}', resend the full code."}).encode())
+        else:
+            self.send_encoded(encoded, 'BYPASS')
+    
+    def send_encoded(self, encoded, cache_status):
+        body, encoding = encoded
+        headers = [('X-Cache', cache_status), ('Vary', 'Accept-Encoding')]
+        if encoding:
+            headers.append(('Content-Encoding', encoding))
+        self.send_body(200, 'application/json', body, headers)
+    
+    def write_chunk(self, data):
+        # One chunk of a chunked response; an empty one ends it.
+        self.wfile.write(b'%X\r\n%s\r\n' % (len(data), data))
+    
+    def do_GET(self):
+        if self.path in assets:
+            self.send_asset(assets[self.path])
+        elif self.path == '/cache':
+            self.send_body(200, 'application/json', json.dumps({'results': results.stats(), 'segments': segments.stats()}).encode())
         elif self.path.startswith('/files'):
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json')
-            self.end_headers()
-            files = [f for f in os.listdir('.') if f.endswith('.sql')]
-            self.wfile.write(json.dumps(files).encode())
+            self.send_asset(sql_file_listing())
         else:
             super().do_GET()
     
@@ -36,47 +519,88 @@ class CompilerHandler(http.server.SimpleHTTPRequestHandler):
             post_data = self.rfile.read(content_length)
             data = json.loads(post_data.decode())
             
-            source_code = data.get('code', '')
-            
-            lexer = Lexer(source_code)
-            tokens = lexer.tokenize()
-            
-            parser = Parser(tokens)
-            parse_tree = parser.parse()
-            
-            semantic = SemanticAnalyzer(parse_tree, tokens)
-            semantic_errors = semantic.analyze()
+            try:
+                fields, tree_format = result_options(data)
+            except ValueError as e:
+                self.send_body(400, 'application/json', json.dumps({'error': str(e)}).encode())
+                return
+            compress = self.accepts_gzip()
             
-            result = {
-                'lexer': {
-                    'errors': lexer.errors,
-                    'tokens': tokens,
-                    'symbols': lexer.symbols,
-                    'token_count': len(tokens),
-                    'identifier_count': len(lexer.symbols)
-                },
-                'parser': {
-                    'errors': parser.errors,
-                    'tree': self.tree_to_dict(parse_tree) if parse_tree else None
-                },
-                'semantic': {
-                    'errors': semantic_errors,
-                    'symbol_table': semantic.symbol_table,
-                    'symbol_table_dump': semantic.get_symbol_table_dump(),
-                    'annotated_tree': semantic.get_annotated_tree()
-                },
-                'summary': {
-                    'lexical_errors': len(lexer.errors),
-                    'syntax_errors': len(parser.errors),
-                    'semantic_errors': len(semantic_errors),
-                    'success': len(lexer.errors) == 0 and len(parser.errors) == 0 and len(semantic_errors) == 0
-                }
-            }
+            if data.get('document'):
+                self.send_document_analysis(data, fields, tree_format, compress)
+            else:
+                # Identical submissions get the cached response; with
+                # "granularity": "statement" a miss still reuses the lexed and
+                # parsed statements of earlier submissions.
+                source_code = data.get('code', '')
+                key = content_key(source_code, COMPILER_VERSION, TREE_MAX_DEPTH, TREE_MAX_NODES, DUMP_MAX_TABLES,
+                                  fields, tree_format, compress)
+                self.send_analysis(key, analyze_source, source_code, data.get('granularity') == 'statement', fields,
+                                   tree_format, compress)
+        
+        elif self.path == '/analyze_file':
+            # {"filename": a .sql file of the served directory, "fields",
+            # "tree", "viewport": {"line", "lines"}}: the file is analyzed
+            # where it is, and only the viewport's lines of it are sent back.
+            content_length = int(self.headers['Content-Length'])
+            data = json.loads(self.rfile.read(content_length).decode())
+            filename = data.get('filename', '')
+            if not (isinstance(filename, str) and filename.endswith('.sql') and os.path.basename(filename) == filename
+                    and os.path.isfile(filename)):
+                self.send_body(404, 'application/json', json.dumps({'error': f"No file '{filename}' to analyze."}).encode())
+                return
+            try:
+                fields, tree_format = result_options(data)
+                viewport = data.get('viewport')
+                if viewport is not None:
+                    viewport = (viewport.get('line', 1), viewport.get('lines', 100)) if isinstance(viewport, dict) else ()
+                    if not (len(viewport) == 2 and all(type(n) is int for n in viewport)
+                            and viewport[0] >= 1 and 0 <= viewport[1] <= VIEWPORT_MAX_LINES):
+                        raise ValueError(f"Expected 'viewport': {{'line': >= 1, 'lines': 0 to {VIEWPORT_MAX_LINES}}}.")
+            except ValueError as e:
+                self.send_body(400, 'application/json', json.dumps({'error': str(e)}).encode())
+                return
+            compress = self.accepts_gzip()
             
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json')
-            self.end_headers()
-            self.wfile.write(json.dumps(result).encode())
+            # Cached by the file's identity rather than its content, which
+            # this thread never reads.
+            path, stat = os.path.abspath(filename), os.stat(filename)
+            key = content_key(path, COMPILER_VERSION, TREE_MAX_DEPTH, TREE_MAX_NODES, DUMP_MAX_TABLES,
+                              stat.st_mtime_ns, stat.st_size, fields, tree_format, compress, viewport)
+            self.send_analysis(key, analyze_path, path, fields, tree_format, compress, viewport)
+        
+        elif self.path == '/analyze_stream':
+            # Newline-delimited JSON in chunked transfer encoding, written
+            # statement by statement (see iter_stream_result). Runs in this
+            # thread, holding one analysis slot.
+            content_length = int(self.headers['Content-Length'])
+            data = json.loads(self.rfile.read(content_length).decode())
+            if not pool.slots.acquire(blocking=False):
+                self.send_body(503, 'application/json', json.dumps({'error': "Server busy, retry later."}).encode(),
+                               [('Retry-After', '1')])
+                return
+            try:
+                self.send_response(200)
+                self.send_header('Content-type', 'application/x-ndjson')
+                self.send_header('Transfer-Encoding', 'chunked')
+                self.end_headers()
+                for line in iter_stream_result(data.get('code', '')):
+                    self.write_chunk(encode_json(line).encode() + b'\n')
+                self.write_chunk(b'')
+            finally:
+                pool.slots.release()
+        
+        elif self.path == '/analyze_batch':
+            content_length = int(self.headers['Content-Length'])
+            data = json.loads(self.rfile.read(content_length).decode())
+            status, result = self.analyze_batch(data)
+            body, encoding = encode_body(result, self.accepts_gzip())
+            headers = [('Vary', 'Accept-Encoding')]
+            if encoding:
+                headers.append(('Content-Encoding', encoding))
+            if status == 503:
+                headers.append(('Retry-After', '1'))
+            self.send_body(status, 'application/json', body, headers)
         
         elif self.path == '/load':
             content_length = int(self.headers['Content-Length'])
@@ -87,25 +611,185 @@ class CompilerHandler(http.server.SimpleHTTPRequestHandler):
             try:
                 with open(filename, 'r') as f:
                     content = f.read()
-                self.send_response(200)
-                self.send_header('Content-type', 'application/json')
-                self.end_headers()
-                self.wfile.write(json.dumps({'content': content, 'filename': filename}).encode())
+                self.send_body(200, 'application/json', json.dumps({'content': content, 'filename': filename}).encode())
             except Exception as e:
-                self.send_response(500)
-                self.send_header('Content-type', 'application/json')
-                self.end_headers()
-                self.wfile.write(json.dumps({'error': str(e)}).encode())
+                self.send_body(500, 'application/json', json.dumps({'error': str(e)}).encode())
+        
+        else:
+            self.send_error(404)
     
-    def tree_to_dict(self, node):
-        if node is None:
-            return None
+    def analyze_batch(self, data):
+        # {"files": [{"name", "code"}, ...], "schema": DDL, "details": "errors"
+        # or "full"}. The optional schema is compiled once and every file is
+        # checked as if it followed it (positions stay relative to the file).
+        # Files go to the pool in a few chunks per worker.
+        files = data.get('files')
+        if not (isinstance(files, list) and all(isinstance(f, dict) and isinstance(f.get('name', ''), str)
+                                                and isinstance(f.get('code', ''), str) for f in files)):
+            return 400, {'error': "Expected 'files': [{'name': string, 'code': string}, ...]."}
+        files = [(f.get('name', str(i)), f.get('code', '')) for i, f in enumerate(files)]
+        details = data.get('details', 'errors')
+        if details not in ('errors', 'full'):
+            return 400, {'error': "Expected 'details': 'errors' or 'full'."}
+        if not isinstance(data.get('schema', ''), str):
+            return 400, {'error': "Expected 'schema': a DDL script."}
+        
+        result, schema = {}, None
+        if data.get('schema'):
+            schema, schema_errors = Catalog.compile(data['schema'], catalog)
+            result['schema'] = {'tables': len(schema.tables), 'errors': schema_errors}
+        
+        chunk_size = max(1, -(-len(files) // (4 * max(1, pool.workers))))
+        chunks = [files[i:i + chunk_size] for i in range(0, len(files), chunk_size)]
+        # Parse trees come back from the workers flat: pickling the nested
+        # form recurses once per level and fails on deeply nested scripts.
+        try:
+            checked = pool.map(check_sources, chunks, [schema] * len(chunks), [details] * len(chunks),
+                               ['flat'] * len(chunks))
+        except BrokenProcessPool:
+            return 500, {'error': WORKER_DIED}
+        if checked is None:
+            return 503, {'error': "Server busy, retry later."}
+        
+        result['files'] = [entry for entries in checked for entry in entries]
+        for entry in result['files']:
+            if 'result' in entry:
+                parser_result = entry['result']['parser']
+                parser_result['tree'] = CompilerHandler.table_to_dict(parser_result['tree'])
+        failed = sum(not entry['summary']['success'] for entry in result['files'])
+        result['summary'] = {'files': len(files), 'passed': len(files) - failed, 'failed': failed}
+        return 200, result
+    
+    @staticmethod
+    def analyze_code(source_code, by_statement=False, fields=RESULT_FIELDS, tree_format='nested'):
+        if by_statement:
+            compiler = IncrementalCompiler(source_code, catalog, segments)
+            return CompilerHandler.build_result(compiler.tokens, compiler.lexer_errors, compiler.symbols,
+                                                compiler.ast, compiler.parser_errors, compiler.semantic_errors,
+                                                compiler.annotator(), fields, tree_format)
+        
+        lexer = Lexer(source_code, mode='table')
+        tokens = lexer.tokenize()
+        
+        # Phases whose output is not asked for are skipped (the summary
+        # counts errors of all three).
+        ast = parser_errors = semantic = semantic_errors = None
+        if fields.keys() - {'lexer'}:
+            parser = Parser(tokens, mode='pratt')
+            ast, parser_errors = parser.parse_ast(), parser.errors
+            if fields.keys() - {'lexer', 'parser'}:
+                semantic = SemanticAnalyzer(ast, catalog)
+                semantic_errors = semantic.analyze()
+        
+        return CompilerHandler.build_result(tokens, lexer.errors, lexer.symbols, ast, parser_errors, semantic_errors,
+                                            semantic, fields, tree_format)
+    
+    def analyze_document(self, document, data, fields=RESULT_FIELDS, tree_format='nested'):
+        # Incremental mode: the client names its buffer and sends either the
+        # full code (diffed against the previous version) or an explicit edit
+        # {'start', 'end', 'text'} in character offsets. Call with the
+        # document's lock held; None if there is no code to apply an edit to.
+        # A malformed request raises ValueError and leaves the document as it
+        # was.
+        check_document_request(data, None if document.compiler is None else len(document.compiler.code))
+        compiler, document.compiler = document.compiler, None
+        edit = data.get('edit')
+        if compiler is None:
+            if 'code' not in data:
+                return None
+            compiler = IncrementalCompiler(data['code'], catalog, segments)
+        elif edit:
+            compiler.apply_edit(edit['start'], edit['end'], edit.get('text', ''))
+        else:
+            compiler.update(data.get('code', ''))
+        document.compiler = compiler
+        return self.build_result(compiler.tokens, compiler.lexer_errors, compiler.symbols, compiler.ast,
+                                 compiler.parser_errors, compiler.semantic_errors, compiler.annotator(),
+                                 fields, tree_format)
+    
+    @staticmethod
+    def build_result(tokens, lexer_errors, symbols, ast, parser_errors, semantic_errors, semantic,
+                     fields=RESULT_FIELDS, tree_format='nested'):
+        # Only the selected fields are built.
+        encode_tree = CompilerHandler.tree_to_table if tree_format == 'flat' else CompilerHandler.tree_to_dict
+        builders = {
+            'lexer': {
+                'errors': lambda: lexer_errors,
+                'tokens': lambda: tokens,
+                'symbols': lambda: symbols,
+                'token_count': lambda: len(tokens),
+                'identifier_count': lambda: len(symbols)
+            },
+            'parser': {
+                'errors': lambda: parser_errors,
+                'tree': lambda: encode_tree(to_parse_tree(ast))
+            },
+            'semantic': {
+                'errors': lambda: semantic_errors,
+                'symbol_table': lambda: semantic.symbol_table,
+                'symbol_table_dump': lambda: semantic.get_symbol_table_dump(DUMP_MAX_TABLES),
+                'annotated_tree': lambda: semantic.get_annotated_tree(TREE_MAX_DEPTH, TREE_MAX_NODES)
+            }
+        }
+        result = {}
+        for phase, names in fields.items():
+            if phase == 'summary':
+                result[phase] = CompilerHandler.summarize(lexer_errors, parser_errors, semantic_errors)
+            else:
+                result[phase] = {name: builders[phase][name]() for name in names}
+        return result
+    
+    @staticmethod
+    def summarize(lexer_errors, parser_errors, semantic_errors):
         return {
-            'name': str(node),
-            'children': [self.tree_to_dict(child) for child in node.children]
+            'lexical_errors': len(lexer_errors),
+            'syntax_errors': len(parser_errors),
+            'semantic_errors': len(semantic_errors),
+            'success': len(lexer_errors) == 0 and len(parser_errors) == 0 and len(semantic_errors) == 0
         }
     
-    def get_html(self):
+    @staticmethod
+    def tree_to_dict(node):
+        if node is None:
+            return None
+        root = {'name': str(node), 'children': []}
+        stack = [(node, root)]
+        while stack:
+            node, node_dict = stack.pop()
+            for child in node.children:
+                child_dict = {'name': str(child), 'children': []}
+                node_dict['children'].append(child_dict)
+                stack.append((child, child_dict))
+        return root
+    
+    @staticmethod
+    def tree_to_table(node):
+        # Flat encoding of a parse tree: node names in preorder and the index
+        # of each node's parent (-1 for the root), so a parent always comes
+        # before its children and one pass rebuilds the tree.
+        names, parents = [], []
+        stack = [(node, -1)]
+        while stack:
+            node, parent = stack.pop()
+            parents.append(parent)
+            names.append(str(node))
+            index = len(names) - 1
+            stack.extend((child, index) for child in reversed(node.children))
+        return {'names': names, 'parents': parents}
+    
+    @staticmethod
+    def table_to_dict(table):
+        # tree_to_dict() form of a tree_to_table() encoding.
+        nodes = []
+        for name, parent in zip(table['names'], table['parents']):
+            node_dict = {'name': name, 'children': []}
+            if parent >= 0:
+                nodes[parent]['children'].append(node_dict)
+            nodes.append(node_dict)
+        return nodes[0] if nodes else None
+    
+    @staticmethod
+    def get_html():
         return '''<!DOCTYPE html>
 <html lang="en">
 <head>
@@ -162,6 +846,9 @@ class CompilerHandler(http.server.SimpleHTTPRequestHandler):
     </div>
     
     <script>
+        // Identifies this page's buffer so the server can analyze edits incrementally
+        const DOCUMENT_ID = Math.random().toString(36).slice(2);
+        
         // Load available files
         fetch('/files')
             .then(r => r.json())
@@ -217,7 +904,7 @@ class CompilerHandler(http.server.SimpleHTTPRequestHandler):
             fetch('/analyze', {
                 method: 'POST',
                 headers: {'Content-Type': 'application/json'},
-                body: JSON.stringify({code})
+                body: JSON.stringify({code, document: DOCUMENT_ID})
             })
             .then(r => r.json())
             .then(data => {
@@ -288,14 +975,21 @@ class CompilerHandler(http.server.SimpleHTTPRequestHandler):
         }
         
         function renderTree(node, prefix) {
-            let result = node.name + '\\n';
-            for (let i = 0; i < node.children.length; i++) {
-                const isLast = i === node.children.length - 1;
-                const child = node.children[i];
-                result += prefix + (isLast ? '└── ' : '├── ');
-                result += renderTree(child, prefix + (isLast ? '    ' : '│   '));
+            // Explicit stack: trees can be nested deeper than the JS call stack.
+            const parts = [node.name + '\\n'];
+            const stack = [];
+            const pushChildren = (node, prefix) => {
+                for (let i = node.children.length - 1; i >= 0; i--) {
+                    stack.push([node.children[i], prefix, i === node.children.length - 1]);
+                }
+            };
+            pushChildren(node, prefix);
+            while (stack.length > 0) {
+                const [child, childPrefix, isLast] = stack.pop();
+                parts.push(childPrefix + (isLast ? '└── ' : '├── ') + child.name + '\\n');
+                pushChildren(child, childPrefix + (isLast ? '    ' : '│   '));
             }
-            return result;
+            return parts.join('');
         }
         
         function displaySemanticResults(semantic) {
@@ -359,7 +1053,8 @@ class CompilerHandler(http.server.SimpleHTTPRequestHandler):
 </body>
 </html>'''
     
-    def get_css(self):
+    @staticmethod
+    def get_css():
         return '''* {
     margin: 0;
     padding: 0;
@@ -563,18 +1258,40 @@ h3 {
 }
 '''
 
-def main():
-    with socketserver.TCPServer(("", PORT), CompilerHandler) as httpd:
+# The page and its stylesheet never change while the server runs.
+page = StaticAsset('text/html', CompilerHandler.get_html())
+assets = {'/': page, '/index.html': page, '/style.css': StaticAsset('text/css', CompilerHandler.get_css())}
+
+def main(argv):
+    global catalog, pool
+    arguments = argparse.ArgumentParser(description="SQL-like language compiler web interface")
+    arguments.add_argument('catalog', nargs='?', help="schema catalog file (see catalog.py)")
+    arguments.add_argument('--port', type=int, default=PORT)
+    arguments.add_argument('--workers', type=int, default=os.cpu_count(),
+                           help="analysis processes; 0 analyzes in the request threads")
+    arguments.add_argument('--max-pending', type=int, default=MAX_PENDING,
+                           help="analyses queued or running before requests get 503")
+    args = arguments.parse_args(argv[1:])
+    if args.catalog:
+        catalog = Catalog.load(args.catalog)
+    pool = AnalysisPool(args.workers, args.max_pending)
+    # One thread per connection; analyses run on the pool.
+    with http.server.ThreadingHTTPServer(("", args.port), CompilerHandler) as httpd:
         print(f"=============================================================")
         print(f"SQL-Like Language Compiler - Web Interface")
         print(f"=============================================================")
-        print(f"Server running at: http://localhost:{PORT}")
+        print(f"Server running at: http://localhost:{args.port}")
+        print(f"Analysis workers: {args.workers or 'request threads'}, at most {args.max_pending} pending")
+        if catalog:
+            print(f"Catalog: {len(catalog.tables)} tables from {args.catalog}")
         print(f"Press Ctrl+C to stop the server")
         print(f"=============================================================")
         try:
             httpd.serve_forever()
         except KeyboardInterrupt:
             print("\\nServer stopped.")
+        finally:
+            pool.shutdown()
 
 if __name__ == "__main__":
-    main()
+    main(sys.argv)
@@ -0,0 +1,43 @@
+import glob
+import os
+import pytest
+
+# The shipped test_*.sql scripts; tests taking a `sql_path` argument run once
+# for each.
+SQL_FILES = sorted(glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'test_*.sql')))
+
+def pytest_generate_tests(metafunc):
+    if 'sql_path' in metafunc.fixturenames:
+        metafunc.parametrize('sql_path', SQL_FILES, ids=os.path.basename)
+
+@pytest.fixture
+def sql_files():
+    return SQL_FILES
+
+@pytest.fixture
+def read_sql():
+    def read(path):
+        with open(path) as f:
+            return f.read()
+    return read
+
+@pytest.fixture
+def nested_script():
+    # Builds a script declaring t (a INT, b TEXT) and selecting `column` from
+    # it where a sits under `depth` parentheses; `tail` follows it.
+    def build(depth, column='a', tail=''):
+        return ("CREATE TABLE t (a INT, b TEXT);\n"
+                + f"SELECT {column} FROM t WHERE " + "(" * depth + "a" + ")" * depth + " = 1;\n" + tail)
+    return build
+
+@pytest.fixture
+def tree_depth():
+    # Depth of a tree_to_dict() tree, walked without recursion.
+    def depth_of(tree):
+        depth, stack = 0, [(tree, 0)]
+        while stack:
+            node, level = stack.pop()
+            depth = max(depth, level)
+            stack.extend((child, level + 1) for child in node['children'])
+        return depth
+    return depth_of
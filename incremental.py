@@ -0,0 +1,303 @@
+import re
+import threading
+from lexer import Lexer, statement_boundaries
+from ast_nodes import Query, CreateStmt
+from parser import Parser, to_parse_tree
+from semantic import SemanticAnalyzer
+
+# Error messages carry their position as "line L, column C"; segment results
+# are computed with positions relative to the segment. Semantic errors are
+# shifted on output: the names they quote are identifiers or type names, so
+# the position is the only match. Lexer and parser errors quote lexemes,
+# which may look like positions too, so they are recomputed instead (see
+# Segment.errors_at).
+POSITION_RE = re.compile(r'line (\d+), column (\d+)')
+# Rough memory use of a Segment per character of its text (tokens, typed
+# statements, errors), for sizing a shared segment cache.
+SEGMENT_BYTES_PER_CHAR = 48
+# Held while checking segments: compilers sharing a segment store check
+# results, and column types on its statements, in the segment itself.
+check_lock = threading.Lock()
+
+def relocate_token(token, line, col):
+    if line == 1 and col == 1:
+        return token
+    return (token[0], token[1], token[2] + line - 1, token[3] + col - 1 if token[2] == 1 else token[3])
+
+def relocate_error(message, line, col):
+    if line == 1 and col == 1:
+        return message
+    def shift(match):
+        l, c = int(match.group(1)), int(match.group(2))
+        return f"line {l + line - 1}, column {c + col - 1 if l == 1 else c}"
+    return POSITION_RE.sub(shift, message, count=1)
+
+def common_affixes(old, new):
+    # Length of the common prefix and of the common suffix (not overlapping
+    # the prefix), found by bisecting on slice comparisons.
+    limit = min(len(old), len(new))
+    lo, hi = 0, limit
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if old[:mid] == new[:mid]:
+            lo = mid
+        else:
+            hi = mid - 1
+    prefix = lo
+    lo, hi = 0, limit - prefix
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if old[len(old) - mid:] == new[len(new) - mid:]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return prefix, lo
+
+class Segment:
+    # One ';'-terminated stretch of source (a statement plus the whitespace and
+    # comments in front of it), lexed and parsed on its own. Every segment
+    # starts right after a SEMICOLON token, so this gives the same tokens and
+    # statements as lexing and parsing the whole file, with positions
+    # relative to the segment.
+    def __init__(self, text):
+        self.text = text
+        lexer = Lexer(text, mode='table')
+        self.tokens = lexer.tokenize()
+        self.lexer_errors = lexer.errors
+        self.symbols = lexer.symbols
+        parser = Parser(self.tokens, mode='pratt')
+        self.statements = list(parser.iter_statements())
+        self.parser_errors = parser.errors
+        # The parser stops at the first token that cannot start a statement
+        # and ignores the rest of the file.
+        self.halted = parser.current() is not None
+        self.declares = any(isinstance(stmt, CreateStmt) for stmt in self.statements)
+        self.tables = [table for stmt in self.statements for table in SemanticAnalyzer.referenced_tables(stmt)]
+        # Columns of a statement with no table (no FROM) resolve against all
+        # tables.
+        self.unbound = any(type(stmt) in SemanticAnalyzer.CHECKS and not SemanticAnalyzer.referenced_tables(stmt)
+                           for stmt in self.statements)
+        self.newlines = text.count('\n')
+        self.last_line_length = len(text) - text.rfind('\n') - 1
+        self.analyzer = None
+        self.checked = None
+        self.located = None
+    
+    def end_position(self, line, col):
+        if self.newlines:
+            return line + self.newlines, self.last_line_length + 1
+        return line, col + len(self.text)
+    
+    def errors_at(self, line, col):
+        # (lexer errors, parser errors) of the segment starting at (line, col)
+        # of a file, from lexing and parsing it again there, as
+        # parallel.compile_text does. Only segments with such errors pay for
+        # it, once per position.
+        if line == 1 and col == 1 or not (self.lexer_errors or self.parser_errors):
+            return self.lexer_errors, self.parser_errors
+        located = self.located
+        if located is None or located[0] != (line, col):
+            lexer = Lexer(self.text, mode='table', line=line, col=col)
+            parser = Parser(lexer.tokenize(), mode='pratt')
+            for _ in parser.iter_statements():
+                pass
+            located = self.located = ((line, col), lexer.errors, parser.errors)
+        return located[1], located[2]
+    
+    def get_analyzer(self, symbol_table, column_index):
+        if self.analyzer is None:
+            self.analyzer = SemanticAnalyzer(None)
+        self.analyzer.symbol_table = symbol_table
+        self.analyzer.column_index = column_index
+        self.analyzer.errors = []
+        return self.analyzer
+
+def split_segments(code):
+    # Text up to and including each statement-ending ';', then the (possibly
+    # empty) tail after the last one.
+    bounds = statement_boundaries(code)
+    starts = [0] + bounds
+    ends = bounds + [len(code)]
+    return [code[s:e] for s, e in zip(starts, ends) if s < e or s == len(code)]
+
+class IncrementalCompiler:
+    # Keeps per-statement lexer, parser and semantic results for a document so
+    # that an edit only re-lexes and re-parses the statements it touches, and
+    # only re-checks statements whose tables changed. Tables from a catalog
+    # (see catalog.py) are known from the start. Segments only depend on their
+    # text, so compilers can share them through an LRUCache keyed by it.
+    def __init__(self, code='', catalog=None, segment_cache=None):
+        self.catalog = catalog
+        self.segment_cache = segment_cache
+        self.segments = [self.new_segment(text) for text in split_segments(code)]
+        self.analyze()
+    
+    def new_segment(self, text):
+        if self.segment_cache is None:
+            return Segment(text)
+        segment = self.segment_cache.get(text)
+        if segment is None:
+            segment = Segment(text)
+            self.segment_cache.put(text, segment, len(text) * SEGMENT_BYTES_PER_CHAR)
+        return segment
+    
+    @property
+    def code(self):
+        return ''.join(segment.text for segment in self.segments)
+    
+    def update(self, code):
+        old = self.code
+        prefix, suffix = common_affixes(old, code)
+        if prefix == len(old) == len(code):
+            return self
+        return self.apply_edit(prefix, len(old) - suffix, code[prefix:len(code) - suffix])
+    
+    def apply_edit(self, start, end, text):
+        # Replace code[start:end] with text (character offsets).
+        offset, first = 0, None
+        for i, segment in enumerate(self.segments):
+            seg_end = offset + len(segment.text)
+            if first is None and (start < seg_end or i == len(self.segments) - 1):
+                first, first_offset = i, offset
+            if first is not None and (end < seg_end or i == len(self.segments) - 1):
+                last = i
+                break
+            offset = seg_end
+        
+        old_texts = {segment.text: segment for segment in self.segments[first:last + 1]}
+        region = ''.join(segment.text for segment in self.segments[first:last + 1])
+        region = region[:start - first_offset] + text + region[end - first_offset:]
+        # The region must end on a statement boundary (or at the end of the
+        # file); otherwise the edit opened a string or comment that runs on,
+        # so take in the following segments until it does.
+        while True:
+            bounds = statement_boundaries(region)
+            if last == len(self.segments) - 1 or (bounds and bounds[-1] == len(region)):
+                break
+            last += 1
+            old_texts.setdefault(self.segments[last].text, self.segments[last])
+            region += self.segments[last].text
+        
+        texts = split_segments(region)
+        if last < len(self.segments) - 1 and texts and texts[-1] == '':
+            texts.pop()
+        self.segments[first:last + 1] = [old_texts.pop(piece, None) or self.new_segment(piece) for piece in texts]
+        self.analyze()
+        return self
+    
+    def analyze(self):
+        # Lexer output covers every segment; parsing stops with the first
+        # segment whose parse halted, exactly as in Parser.parse().
+        self.parsed = []
+        for segment in self.segments:
+            self.parsed.append(segment)
+            if segment.halted:
+                break
+        
+        # Catalog tables are shared unless the document declares its own.
+        if self.catalog is None:
+            self.symbol_table, self.column_index = {}, {}
+        elif any(segment.declares for segment in self.parsed):
+            self.symbol_table, self.column_index = dict(self.catalog.tables), dict(self.catalog.column_index)
+        else:
+            self.symbol_table, self.column_index = self.catalog.tables, self.catalog.column_index
+        self.create_errors = []
+        with check_lock:
+            for segment, (line, col) in zip(self.parsed, self.positions()):
+                if segment.declares:
+                    analyzer = segment.get_analyzer(self.symbol_table, self.column_index)
+                    for stmt in segment.statements:
+                        analyzer.declare_tables(stmt)
+                    self.create_errors.extend(relocate_error(e, line, col) for e in analyzer.errors)
+            self.check_segments()
+        return self
+    
+    def check_segments(self):
+        # A statement's checks and column types only depend on the definitions
+        # of the tables it references (or, without a table, on the column
+        # index), so its cached results stay valid while those are unchanged.
+        # The errors are kept per compiler: another one may check a shared
+        # segment against other tables afterwards. Call with check_lock held.
+        self.check_errors = []
+        schemas = {}
+        for segment in self.parsed:
+            for table in segment.tables:
+                if table not in schemas:
+                    info = self.symbol_table.get(table)
+                    schemas[table] = tuple(info['columns'].items()) if info else None
+            key = tuple(schemas[table] for table in segment.tables)
+            if segment.unbound:
+                key += (tuple(self.column_index.items()),)
+            if segment.checked is None or segment.checked[0] != key:
+                analyzer = segment.get_analyzer(self.symbol_table, self.column_index)
+                for stmt in segment.statements:
+                    analyzer.check_statement(stmt)
+                segment.checked = (key, analyzer.errors)
+            self.check_errors.append(segment.checked[1])
+    
+    def positions(self):
+        line, col = 1, 1
+        for segment in self.segments:
+            yield line, col
+            line, col = segment.end_position(line, col)
+    
+    @property
+    def tokens(self):
+        return [relocate_token(token, line, col)
+                for segment, (line, col) in zip(self.segments, self.positions())
+                for token in segment.tokens]
+    
+    @property
+    def lexer_errors(self):
+        return [e for segment, (line, col) in zip(self.segments, self.positions())
+                for e in segment.errors_at(line, col)[0]]
+    
+    @property
+    def symbols(self):
+        symbols = {}
+        for segment, (line, col) in zip(self.segments, self.positions()):
+            for name, info in segment.symbols.items():
+                if name in symbols:
+                    symbols[name]['count'] += info['count']
+                else:
+                    l, c = info['line'], info['col']
+                    symbols[name] = {'line': l + line - 1, 'col': c + col - 1 if l == 1 else c, 'count': info['count']}
+        return symbols
+    
+    @property
+    def ast(self):
+        # Statement spans are relative to their segment.
+        return Query([stmt for segment in self.parsed for stmt in segment.statements])
+    
+    @property
+    def parse_tree(self):
+        return to_parse_tree(self.ast)
+    
+    @property
+    def parser_errors(self):
+        return [e for segment, (line, col) in zip(self.parsed, self.positions())
+                for e in segment.errors_at(line, col)[1]]
+    
+    @property
+    def semantic_errors(self):
+        return self.create_errors + [relocate_error(e, line, col)
+                                     for errors, (line, col) in zip(self.check_errors, self.positions())
+                                     for e in errors]
+    
+    def annotator(self):
+        return Annotator(self)
+
+class Annotator(SemanticAnalyzer):
+    # Annotated tree of a compiler's statements. The column types it shows
+    # are stored on the statements, which other compilers sharing a segment
+    # may have checked against their own tables since, so the segments are
+    # checked again (only where that happened) first.
+    def __init__(self, compiler):
+        super().__init__(compiler.ast)
+        self.symbol_table, self.column_index = compiler.symbol_table, compiler.column_index
+        self.compiler = compiler
+    
+    def get_annotated_tree(self, max_depth=None, max_nodes=None):
+        with check_lock:
+            self.compiler.check_segments()
+            return super().get_annotated_tree(max_depth, max_nodes)
@@ -1,16 +1,172 @@
+import codecs
+import re
+import sys
+from array import array
+from bisect import bisect_right
+
 KEYWORDS = {'SELECT', 'FROM', 'WHERE', 'INSERT', 'INTO', 'VALUES', 'UPDATE', 'SET', 
             'DELETE', 'CREATE', 'TABLE', 'INT', 'FLOAT', 'TEXT', 'AND', 'OR', 'NOT'}
 
+OPERATORS = {'+': 'PLUS', '-': 'MINUS', '*': 'MULTIPLY', '/': 'DIVIDE', 
+             '%': 'MODULO', '=': 'EQUAL', '<': 'LESS_THAN', '>': 'GREATER_THAN', 
+             '(': 'LPAREN', ')': 'RPAREN', ',': 'COMMA', ';': 'SEMICOLON', '.': 'DOT'}
+
+# Character classes for the table-driven scanner. Only ASCII is classified;
+# anything else goes through the character-at-a-time path so that the
+# str.isdigit()/str.isalpha() semantics stay exactly the same.
+WS, DASH, SLASH, HASH, QUOTE, DIGIT, WORD, OP, BANG, LESS, GREATER, INVALID = range(12)
+CHAR_CLASS = {chr(i): INVALID for i in range(128)}
+CHAR_CLASS.update({c: WS for c in ' \t\n\r'})
+CHAR_CLASS.update({c: DIGIT for c in '0123456789'})
+CHAR_CLASS.update({c: WORD for c in 'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ_'})
+CHAR_CLASS.update({c: OP for c in OPERATORS})
+CHAR_CLASS.update({'-': DASH, '/': SLASH, '#': HASH, "'": QUOTE, '!': BANG, '<': LESS, '>': GREATER})
+
+COMPARE_EQUAL = {BANG: 'NOT_EQUAL', LESS: 'LESS_EQUAL', GREATER: 'GREATER_EQUAL'}
+
+WHITESPACE_RE = re.compile(r'[ \t\n\r]+')
+WORD_RE = re.compile(r'\w*')
+NUMBER_RE = re.compile(r'\d*(?:\.\d*)?')
+STRING_BODY_RE = re.compile(r"[^']*(?:''[^']*)*")
+FALLBACK_EXTENT_RE = re.compile(r'[\w.]*')
+
+# Everything that can hide a ';' from the lexer: strings (closed or running to
+# the end of input) and the four comment styles. Any other ';' is a token.
+STATEMENT_END_RE = re.compile(r"'[^']*(?:''[^']*)*'?|--[^\n]*|##.*?(?:##|\Z)|#[^\n]*|/\*.*?(?:\*/|\Z)|;", re.S)
+
+LEXER_MODES = ('char', 'table')
+
+TOKEN_TYPES = (tuple(sorted(KEYWORDS)) + ('IDENTIFIER', 'NUMBER_LITERAL', 'STRING_LITERAL') +
+               tuple(OPERATORS.values()) + tuple(COMPARE_EQUAL.values()))
+TYPE_CODES = {token_type: code for code, token_type in enumerate(TOKEN_TYPES)}
+FIXED_LEXEMES = {keyword: keyword for keyword in KEYWORDS}
+FIXED_LEXEMES.update({token_type: char for char, token_type in OPERATORS.items()})
+FIXED_LEXEMES.update({'NOT_EQUAL': '!=', 'LESS_EQUAL': '<=', 'GREATER_EQUAL': '>='})
+
+def iter_statement_boundaries(code, start=0, end=None):
+    # Offsets just past each SEMICOLON token in code[start:end], found without
+    # tokenizing. The lexer is between tokens at each of them, so the text on
+    # either side can be lexed independently.
+    for match in STATEMENT_END_RE.finditer(code, start, len(code) if end is None else end):
+        if match.group() == ';':
+            yield match.end()
+
+def statement_boundaries(code, start=0, end=None):
+    return list(iter_statement_boundaries(code, start, end))
+
+class LineIndex:
+    # Offsets of every line start in `code`, built once with str.find(). Tokens
+    # and errors keep raw offsets; (line, col) is only resolved through this
+    # table when a message or token tuple needs it. `line`/`col` give the
+    # position of offset 0, for text that starts part-way through a file.
+    def __init__(self, code, line=1, col=1):
+        self.line, self.col = line, col
+        starts = array('I', [0])
+        find = code.find
+        i = find('\n')
+        while i >= 0:
+            starts.append(i + 1)
+            i = find('\n', i + 1)
+        self.starts = starts
+        self.last = 0
+    
+    def position(self, offset):
+        starts, k = self.starts, self.last
+        if offset < starts[k] or (k + 1 < len(starts) and offset >= starts[k + 1]):
+            k = self.last = bisect_right(starts, offset) - 1
+        if k == 0:
+            return self.line, self.col + offset
+        return self.line + k, offset - starts[k] + 1
+
+class TokenBuffer:
+    # Struct-of-arrays token store: one byte for the type and two 32-bit
+    # offsets per token. Lexemes are sliced out of the source and positions
+    # resolved through the LineIndex only when a token is read; indexing and
+    # iterating yield the usual (type, value, line, col) tuples so Parser and
+    # SemanticAnalyzer work as-is.
+    def __init__(self, code, line_index):
+        self.code = code
+        self.line_index = line_index
+        self.types = array('B')
+        self.starts = array('I')
+        self.ends = array('I')
+        self.last = (-1, None)
+    
+    def add(self, token_type, value, start, end, line, col):
+        self.types.append(TYPE_CODES[token_type])
+        self.starts.append(start)
+        self.ends.append(end)
+    
+    def __len__(self):
+        return len(self.types)
+    
+    def type_at(self, i):
+        return TOKEN_TYPES[self.types[i]]
+    
+    def value_at(self, i):
+        token_type = TOKEN_TYPES[self.types[i]]
+        if token_type in FIXED_LEXEMES:
+            return FIXED_LEXEMES[token_type]
+        start, end = self.starts[i], self.ends[i]
+        if token_type == 'IDENTIFIER':
+            return sys.intern(self.code[start:end])
+        if token_type == 'NUMBER_LITERAL':
+            return self.code[start:end]
+        # A closed string ends in an odd run of quotes (the last one closes it);
+        # an unclosed one runs to the end of input with only '' escapes.
+        body = self.code[start + 1:end]
+        if (len(body) - len(body.rstrip("'"))) % 2:
+            body = body[:-1]
+        return body.replace("''", "'")
+    
+    def position_at(self, i):
+        return self.line_index.position(self.starts[i])
+    
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if self.last[0] == i:
+            return self.last[1]
+        token = (self.type_at(i), self.value_at(i)) + self.position_at(i)
+        self.last = (i, token)
+        return token
+    
+    def __iter__(self):
+        for i in range(len(self)):
+            yield (self.type_at(i), self.value_at(i)) + self.position_at(i)
+    
+    def to_list(self):
+        return list(self)
+
 class Lexer:
-    def __init__(self, code):
+    def __init__(self, code, mode='char', compact=False, line=1, col=1):
+        if mode not in LEXER_MODES:
+            raise ValueError(f"Unknown lexer mode '{mode}', expected one of {', '.join(LEXER_MODES)}.")
+        if compact and mode != 'table':
+            raise ValueError("Compact token storage requires mode='table'.")
+        self.mode = mode
+        self.compact = compact
+        self.reset(code, line, col)
+    
+    def reset(self, code, line=1, col=1):
         self.code = code
         self.pos = 0
-        self.line = 1
-        self.col = 1
-        self.tokens = []
+        self.line_index = LineIndex(code, line, col)
+        self.position = self.line_index.position
+        self.tokens = TokenBuffer(code, self.line_index) if self.compact else []
         self.errors = []
         self.symbols = {}
     
+    @property
+    def line(self):
+        return self.position(self.pos)[0]
+    
+    @property
+    def col(self):
+        return self.position(self.pos)[1]
+    
     def current(self):
         return self.code[self.pos] if self.pos < len(self.code) else None
     
@@ -19,11 +175,6 @@ class Lexer:
     
     def advance(self):
         if self.pos < len(self.code):
-            if self.code[self.pos] == '\n':
-                self.line += 1
-                self.col = 1
-            else:
-                self.col += 1
             self.pos += 1
     
     def skip_whitespace(self):
@@ -39,7 +190,7 @@ class Lexer:
             return
         
         if self.current() == '/' and self.peek() == '*':
-            start_line, start_col = self.line, self.col
+            start_line, start_col = self.position(self.pos)
             self.advance()
             self.advance()
             while self.current():
@@ -52,7 +203,7 @@ class Lexer:
             return
         
         if self.current() == '#' and self.peek() == '#':
-            start_line, start_col = self.line, self.col
+            start_line, start_col = self.position(self.pos)
             self.advance()
             self.advance()
             while self.current():
@@ -63,7 +214,7 @@ class Lexer:
                 self.advance()
             self.errors.append(f"Error: unclosed comment starting at line {start_line}, column {start_col}.")
             return
-
+        
         if self.current() == '#':
             self.advance()
             while self.current() and self.current() != '\n':
@@ -71,7 +222,7 @@ class Lexer:
             return
     
     def read_string(self):
-        start_line, start_col = self.line, self.col
+        start_line, start_col = self.position(self.pos)
         value = ""
         self.advance()
         while self.current():
@@ -90,7 +241,7 @@ class Lexer:
         return ('STRING_LITERAL', value, start_line, start_col)
     
     def read_number(self):
-        start_line, start_col = self.line, self.col
+        start_line, start_col = self.position(self.pos)
         value = ""
         has_dot = False
         while self.current() and (self.current().isdigit() or self.current() == '.'):
@@ -103,7 +254,7 @@ class Lexer:
         return ('NUMBER_LITERAL', value, start_line, start_col)
     
     def read_word(self):
-        start_line, start_col = self.line, self.col
+        start_line, start_col = self.position(self.pos)
         value = ""
         while self.current() and (self.current().isalnum() or self.current() == '_'):
             value += self.current()
@@ -121,46 +272,253 @@ class Lexer:
             return ('IDENTIFIER', value, start_line, start_col)
     
     def tokenize(self):
-        operators = {'+': 'PLUS', '-': 'MINUS', '*': 'MULTIPLY', '/': 'DIVIDE', 
-                    '%': 'MODULO', '=': 'EQUAL', '<': 'LESS_THAN', '>': 'GREATER_THAN', 
-                    '(': 'LPAREN', ')': 'RPAREN', ',': 'COMMA', ';': 'SEMICOLON', '.': 'DOT'}
-        
+        if self.mode == 'table':
+            return self.tokenize_table()
         while self.current():
-            if self.current() in ' \t\n\r':
-                self.skip_whitespace()
-            elif self.current() == '-' and self.peek() == '-':
-                self.skip_comment()
-            elif self.current() == '/' and self.peek() == '*':
-                self.skip_comment()
-            elif self.current() == '#':
-                self.skip_comment()
-            elif self.current() == "'":
-                self.tokens.append(self.read_string())
-            elif self.current().isdigit():
-                self.tokens.append(self.read_number())
-            elif self.current().isalpha() or self.current() == '_':
-                self.tokens.append(self.read_word())
+            self.scan_char()
+        return self.tokens
+    
+    def scan_char(self):
+        if self.current() in ' \t\n\r':
+            self.skip_whitespace()
+        elif self.current() == '-' and self.peek() == '-':
+            self.skip_comment()
+        elif self.current() == '/' and self.peek() == '*':
+            self.skip_comment()
+        elif self.current() == '#':
+            self.skip_comment()
+        elif self.current() == "'":
+            self.tokens.append(self.read_string())
+        elif self.current().isdigit():
+            self.tokens.append(self.read_number())
+        elif self.current().isalpha() or self.current() == '_':
+            self.tokens.append(self.read_word())
+        else:
+            char = self.current()
+            line, col = self.position(self.pos)
+            
+            if char == '!' and self.peek() == '=':
+                self.advance()
+                self.advance()
+                self.tokens.append(('NOT_EQUAL', '!=', line, col))
+            elif char == '<' and self.peek() == '=':
+                self.advance()
+                self.advance()
+                self.tokens.append(('LESS_EQUAL', '<=', line, col))
+            elif char == '>' and self.peek() == '=':
+                self.advance()
+                self.advance()
+                self.tokens.append(('GREATER_EQUAL', '>=', line, col))
+            elif char in OPERATORS:
+                self.tokens.append((OPERATORS[char], char, line, col))
+                self.advance()
             else:
-                char = self.current()
-                line, col = self.line, self.col
-                
-                if char == '!' and self.peek() == '=':
-                    self.advance()
-                    self.advance()
-                    self.tokens.append(('NOT_EQUAL', '!=', line, col))
-                elif char == '<' and self.peek() == '=':
-                    self.advance()
-                    self.advance()
-                    self.tokens.append(('LESS_EQUAL', '<=', line, col))
-                elif char == '>' and self.peek() == '=':
-                    self.advance()
-                    self.advance()
-                    self.tokens.append(('GREATER_EQUAL', '>=', line, col))
-                elif char in operators:
-                    self.tokens.append((operators[char], char, line, col))
-                    self.advance()
+                self.errors.append(f"Error: invalid character '{char}' at line {line}, column {col}.")
+                self.advance()
+    
+    def tokenize_table(self, final=True):
+        # Same tokens, errors and symbols as the 'char' mode, but each lexeme is
+        # located with a single regex match or str.find() and sliced out of the
+        # source instead of being built one character at a time.
+        #
+        # With final=False the source is only a prefix of the input: scanning
+        # stops in front of the first lexeme that touches the end of the buffer
+        # (it may continue in the next chunk) and self.pos is left there.
+        code, n = self.code, len(self.code)
+        tokens, errors, symbols = self.tokens, self.errors, self.symbols
+        if isinstance(tokens, TokenBuffer):
+            emit = tokens.add
+        else:
+            append = tokens.append
+            def emit(token_type, value, start, end, line, col):
+                append((token_type, value, line, col))
+        char_class = CHAR_CLASS
+        more = not final
+        index = self.line_index
+        starts, last_line = index.starts, len(index.starts) - 1
+        pos = self.pos
+        next_start = -1
+        
+        while pos < n:
+            if pos >= next_start:
+                # Crossed into a later line: one binary search in the line table.
+                k = bisect_right(starts, pos) - 1
+                line = index.line + k
+                col_shift = starts[k] - 1 if k else -index.col
+                next_start = starts[k + 1] if k < last_line else n + 1
+            ch = code[pos]
+            kind = char_class.get(ch)
+            col = pos - col_shift
+            
+            if kind == WS:
+                end = WHITESPACE_RE.match(code, pos).end()
+                if more and end >= n:
+                    break
+            elif kind == WORD:
+                end = WORD_RE.match(code, pos).end()
+                if more and end >= n:
+                    break
+                value = code[pos:end]
+                if value in KEYWORDS:
+                    emit(value, value, pos, end, line, col)
                 else:
-                    self.errors.append(f"Error: invalid character '{char}' at line {line}, column {col}.")
-                    self.advance()
+                    if value.upper() in KEYWORDS:
+                        errors.append(f"Error: keyword '{value.upper()}' must be uppercase at line {line}, column {col}.")
+                    if value not in symbols:
+                        symbols[value] = {'line': line, 'col': col, 'count': 0}
+                    symbols[value]['count'] += 1
+                    emit('IDENTIFIER', value, pos, end, line, col)
+                pos = end
+                continue
+            elif kind == DIGIT:
+                end = NUMBER_RE.match(code, pos).end()
+                if more and end >= n:
+                    break
+                if code[end:end + 1].isdigit():
+                    kind = None
+                else:
+                    emit('NUMBER_LITERAL', code[pos:end], pos, end, line, col)
+                    pos = end
+                    continue
+            elif kind == OP:
+                emit(OPERATORS[ch], ch, pos, pos + 1, line, col)
+                pos += 1
+                continue
+            elif kind == QUOTE:
+                end = STRING_BODY_RE.match(code, pos + 1).end()
+                if more and end + 1 >= n:
+                    break
+                value = code[pos + 1:end].replace("''", "'")
+                if end < n:
+                    end += 1
+                else:
+                    errors.append(f"Error: unclosed string starting at line {line}, column {col}.")
+                emit('STRING_LITERAL', value, pos, end, line, col)
+            elif more and pos + 1 >= n and kind != INVALID:
+                break
+            elif kind == DASH:
+                if code.startswith('-', pos + 1):
+                    end = code.find('\n', pos + 2)
+                    if end < 0:
+                        if more:
+                            break
+                        end = n
+                    pos = end
+                else:
+                    emit('MINUS', '-', pos, pos + 1, line, col)
+                    pos += 1
+                continue
+            elif kind == SLASH:
+                if code.startswith('*', pos + 1):
+                    end = code.find('*/', pos + 2)
+                    if end < 0:
+                        if more:
+                            break
+                        errors.append(f"Error: unclosed comment starting at line {line}, column {col}.")
+                        end = n
+                    else:
+                        end += 2
+                else:
+                    emit('DIVIDE', '/', pos, pos + 1, line, col)
+                    pos += 1
+                    continue
+            elif kind == HASH:
+                if code.startswith('#', pos + 1):
+                    end = code.find('##', pos + 2)
+                    if end < 0:
+                        if more:
+                            break
+                        errors.append(f"Error: unclosed comment starting at line {line}, column {col}.")
+                        end = n
+                    else:
+                        end += 2
+                else:
+                    end = code.find('\n', pos + 1)
+                    if end < 0:
+                        if more:
+                            break
+                        end = n
+                    pos = end
+                    continue
+            elif kind in (BANG, LESS, GREATER):
+                if code.startswith('=', pos + 1):
+                    emit(COMPARE_EQUAL[kind], ch + '=', pos, pos + 2, line, col)
+                    pos += 2
+                elif kind == BANG:
+                    errors.append(f"Error: invalid character '{ch}' at line {line}, column {col}.")
+                    pos += 1
+                else:
+                    emit(OPERATORS[ch], ch, pos, pos + 1, line, col)
+                    pos += 1
+                continue
+            elif kind == INVALID:
+                errors.append(f"Error: invalid character '{ch}' at line {line}, column {col}.")
+                pos += 1
+                continue
+            
+            if kind is None:
+                # Non-ASCII start (or a number running into a non-ASCII digit):
+                # let the reference scanner consume exactly one step. Words and
+                # numbers never extend past a run of [\w.] characters.
+                if more and FALLBACK_EXTENT_RE.match(code, pos).end() >= n:
+                    break
+                self.pos = pos
+                self.tokens = []
+                self.scan_char()
+                for token in self.tokens:
+                    emit(token[0], token[1], pos, self.pos, token[2], token[3])
+                self.tokens = tokens
+                pos = self.pos
+                continue
+            
+            pos = end
+        
+        self.pos = pos
+        return tokens
+
+
+class StreamLexer(Lexer):
+    # Lexes a file object (text or binary) or an mmap chunk by chunk and yields
+    # tokens as they are recognised, so only the current chunk and the token
+    # being built are held in memory. Errors and symbols accumulate as usual.
+    def __init__(self, source, chunk_size=1 << 20, encoding='utf-8'):
+        super().__init__('', mode='table')
+        self.source = source
+        self.chunk_size = chunk_size
+        self.decoder = codecs.getincrementaldecoder(encoding)()
+    
+    def read_chunk(self, size):
+        # Returns '' only at end of input; a chunk ending inside a multi-byte
+        # character decodes to nothing, so keep reading.
+        while True:
+            data = self.source.read(size)
+            if isinstance(data, str):
+                return data
+            text = self.decoder.decode(data, final=not data)
+            if text or not data:
+                return text
+    
+    def __iter__(self):
+        size = self.chunk_size
+        while True:
+            chunk = self.read_chunk(size)
+            final = not chunk
+            # Drop the consumed prefix; the line table of the new buffer starts
+            # at the position where scanning stopped.
+            line, col = self.position(self.pos)
+            self.code = self.code[self.pos:] + chunk
+            self.line_index = LineIndex(self.code, line, col)
+            self.position = self.line_index.position
+            self.pos = 0
+            self.tokenize_table(final)
+            yield from self.tokens
+            self.tokens.clear()
+            if final:
+                return
+            # A single lexeme longer than the buffer (a huge string or comment):
+            # read bigger chunks so it is not rescanned once per chunk.
+            size = self.chunk_size if self.pos else size * 2
+    
+    def tokenize(self):
+        self.tokens = list(self)
         return self.tokens
-    
\ No newline at end of file
@@ -0,0 +1,69 @@
+import argparse
+import glob
+import http.client
+import json
+import threading
+import time
+import urllib.parse
+from collections import Counter
+
+# Load test for the web interface: concurrent clients, each on its own
+# keep-alive connection, post SQL files to /analyze and the throughput,
+# latency percentiles and response statuses are reported.
+#
+#   python compiler.py --workers 4 &
+#   python loadtest.py --clients 16 --requests 50 --unique test_*.sql
+
+def percentile(samples, fraction):
+    return samples[min(len(samples) - 1, int(fraction * len(samples)))]
+
+def run_client(url, sources, requests, unique, client, latencies, statuses, lock):
+    connection = http.client.HTTPConnection(url.hostname, url.port or 80)
+    for i in range(requests):
+        code = sources[(client + i) % len(sources)]
+        if unique:
+            # A trailing comment gives every request its own cache key.
+            code += f"\n-- client {client} request {i}\n"
+        start = time.perf_counter()
+        connection.request('POST', '/analyze', json.dumps({'code': code}), {'Content-Type': 'application/json'})
+        response = connection.getresponse()
+        response.read()
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+            statuses[f"{response.status} {response.getheader('X-Cache') or ''}".strip()] += 1
+    connection.close()
+
+def main():
+    arguments = argparse.ArgumentParser(description="Load test for the compiler web interface")
+    arguments.add_argument('files', nargs='*', help="SQL files to post (default: test_*.sql)")
+    arguments.add_argument('--url', default='http://localhost:8080')
+    arguments.add_argument('--clients', type=int, default=8)
+    arguments.add_argument('--requests', type=int, default=50, help="requests per client")
+    arguments.add_argument('--unique', action='store_true', help="defeat the result cache")
+    args = arguments.parse_args()
+    
+    sources = []
+    for path in args.files or sorted(glob.glob('test_*.sql')):
+        with open(path) as f:
+            sources.append(f.read())
+    url = urllib.parse.urlparse(args.url)
+    latencies, statuses, lock = [], Counter(), threading.Lock()
+    clients = [threading.Thread(target=run_client, args=(url, sources, args.requests, args.unique, i, latencies, statuses, lock))
+               for i in range(args.clients)]
+    
+    start = time.perf_counter()
+    for client in clients:
+        client.start()
+    for client in clients:
+        client.join()
+    elapsed = time.perf_counter() - start
+    
+    latencies.sort()
+    print(f"{len(latencies)} requests from {args.clients} clients in {elapsed:.2f}s: {len(latencies) / elapsed:.1f} requests/s")
+    print(f"latency p50 {percentile(latencies, 0.5) * 1000:.1f} ms, p95 {percentile(latencies, 0.95) * 1000:.1f} ms, "
+          f"p99 {percentile(latencies, 0.99) * 1000:.1f} ms, max {latencies[-1] * 1000:.1f} ms")
+    print("responses: " + ", ".join(f"{status}: {count}" for status, count in sorted(statuses.items())))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+import os
+import pickle
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from ast_nodes import Query, CreateStmt, flatten, unflatten
+from lexer import Lexer, iter_statement_boundaries
+from parser import Parser, to_parse_tree
+from semantic import SemanticAnalyzer
+
+# Source text (front end) or frozen symbol table and column index (semantic
+# checks) of the current run in a pool worker, set once by the pool
+# initializer so that tasks only carry offsets or pickled statements.
+source = None
+catalog = None
+
+def set_source(code):
+    global source
+    source = code
+
+def set_catalog(symbol_table, column_index):
+    global catalog
+    catalog = symbol_table, column_index
+
+def compile_chunk(start, end, line, col):
+    # Statements travel back pickled and are only unpickled in the parent
+    # when they are asked for.
+    tokens, lexer_errors, symbols, statements, parser_errors, halted, creates = compile_text(source, start, end, line, col)
+    return tokens, lexer_errors, symbols, dump_statements(statements), parser_errors, halted, creates
+
+def compile_text(code, start, end, line, col):
+    # Lex and parse code[start:end]. It starts on a statement boundary at
+    # (line, col) of the file, so tokens, errors and spans come out exactly
+    # as in a run over the whole file.
+    lexer = Lexer(code[start:end], mode='table', line=line, col=col)
+    tokens = lexer.tokenize()
+    parser = Parser(tokens)
+    statements = list(parser.iter_statements())
+    creates = [stmt for stmt in statements if isinstance(stmt, CreateStmt)]
+    return tokens, lexer.errors, lexer.symbols, statements, parser.errors, parser.current() is not None, creates
+
+def dump_statements(statements):
+    # Pickling recurses once per tree level, so a chunk with expressions
+    # nested too deep for that goes in flatten()'s form instead.
+    if isinstance(statements, bytes):
+        return statements
+    try:
+        return pickle.dumps(statements, pickle.HIGHEST_PROTOCOL)
+    except RecursionError:
+        return pickle.dumps(flatten(statements), pickle.HIGHEST_PROTOCOL)
+
+def load_statements(statements):
+    if isinstance(statements, bytes):
+        statements = pickle.loads(statements)
+        if statements and isinstance(statements[0], tuple):
+            statements = unflatten(statements)
+    return statements
+
+def check_chunk(statements):
+    return check_statements(*catalog, statements)
+
+def check_statements(symbol_table, column_index, statements):
+    analyzer = SemanticAnalyzer(None)
+    analyzer.symbol_table, analyzer.column_index = symbol_table, column_index
+    for stmt in load_statements(statements):
+        analyzer.check_statement(stmt)
+    return analyzer.errors
+
+def iter_chunks(code, chunk_size):
+    # (start, end, line, col) of consecutive pieces of at least chunk_size
+    # characters (but the last), each ending just past a statement's ';'.
+    # A chunk_size of 1 gives one piece per statement. Boundaries are found
+    # as the pieces are taken.
+    bounds = iter_statement_boundaries(code)
+    start, line, col = 0, 1, 1
+    while start < len(code):
+        end = next((bound for bound in bounds if bound >= start + chunk_size), len(code))
+        yield start, end, line, col
+        newlines = code.count('\n', start, end)
+        if newlines:
+            line, col = line + newlines, end - code.rfind('\n', start, end)
+        else:
+            col += end - start
+        start = end
+
+def split_chunks(code, chunk_size):
+    return list(iter_chunks(code, chunk_size)) or [(0, 0, 1, 1)]
+
+class ParallelFrontEnd:
+    # Lexes and parses a script in statement-aligned chunks on a process pool
+    # and merges the results in source order, giving the same tokens, errors,
+    # symbols and statements as Lexer and Parser over the whole text.
+    def __init__(self, code, workers=None, chunk_size=1 << 20):
+        self.code, self.workers, self.chunk_size = code, workers, chunk_size
+        self.tokens, self.lexer_errors, self.symbols = [], [], {}
+        self.chunk_statements, self.parser_errors, self.creates = [], [], []
+        self._statements = None
+        self.symbol_table, self.column_index, self.semantic_errors = {}, {}, []
+    
+    def run(self):
+        chunks = split_chunks(self.code, self.chunk_size)
+        if len(chunks) == 1 or self.workers == 1:
+            self.merge(compile_text(self.code, *chunk) for chunk in chunks)
+        else:
+            with ProcessPoolExecutor(self.workers, initializer=set_source, initargs=(self.code,)) as pool:
+                self.merge(pool.map(compile_chunk, *zip(*chunks)))
+        return self
+    
+    def merge(self, results):
+        # Lexer output covers every chunk; parsing stops with the first chunk
+        # whose parse halted, exactly as in Parser.parse().
+        halted = False
+        for tokens, lexer_errors, symbols, statements, parser_errors, chunk_halted, creates in results:
+            self.tokens.extend(tokens)
+            self.lexer_errors.extend(lexer_errors)
+            for name, info in symbols.items():
+                if name in self.symbols:
+                    self.symbols[name]['count'] += info['count']
+                else:
+                    self.symbols[name] = info
+            if not halted:
+                self.chunk_statements.append(statements)
+                self.parser_errors.extend(parser_errors)
+                self.creates.extend(creates)
+                halted = chunk_halted
+    
+    def analyze(self):
+        # Semantic analysis after run(): CREATE TABLE statements are declared
+        # here in source order, then the symbol table is frozen, shipped once
+        # to each worker and the parsed chunks are checked concurrently. The
+        # errors are the same, in the same order, as SemanticAnalyzer.analyze();
+        # their positions come from node spans, which are already absolute.
+        # Column types are resolved on self.statements when checked in this
+        # process; workers send back only errors, so their types are not kept.
+        # Each call starts over.
+        analyzer = SemanticAnalyzer(None)
+        for stmt in self.creates:
+            analyzer.declare_tables(stmt)
+        self.symbol_table, self.column_index = analyzer.symbol_table, analyzer.column_index
+        self.semantic_errors = analyzer.errors
+        if len(self.chunk_statements) <= 1 or self.workers == 1:
+            self.semantic_errors.extend(check_statements(self.symbol_table, self.column_index, self.statements))
+        else:
+            with ProcessPoolExecutor(self.workers, initializer=set_catalog,
+                                     initargs=(self.symbol_table, self.column_index)) as pool:
+                for errors in pool.map(check_chunk, map(dump_statements, self.chunk_statements)):
+                    self.semantic_errors.extend(errors)
+        return self.semantic_errors
+    
+    @property
+    def statements(self):
+        if self._statements is None:
+            self._statements = [stmt for statements in self.chunk_statements for stmt in load_statements(statements)]
+        return self._statements
+    
+    @property
+    def ast(self):
+        return Query(self.statements)
+    
+    @property
+    def parse_tree(self):
+        return to_parse_tree(self.ast)
+
+def main(argv):
+    # python parallel.py script.sql [workers]: timings of all three phases
+    # against a serial run.
+    with open(argv[1]) as f:
+        code = f.read()
+    workers = int(argv[2]) if len(argv) > 2 else os.cpu_count()
+    
+    start = time.perf_counter()
+    lexer = Lexer(code, mode='table')
+    tokens = lexer.tokenize()
+    parser = Parser(tokens)
+    SemanticAnalyzer(parser.parse_ast()).analyze()
+    serial = time.perf_counter() - start
+    
+    start, start_cpu = time.perf_counter(), time.process_time()
+    front_end = ParallelFrontEnd(code, workers).run()
+    front_end.analyze()
+    parallel, parent_cpu = time.perf_counter() - start, time.process_time() - start_cpu
+    
+    print(f"{len(front_end.tokens)} tokens, {len(front_end.chunk_statements)} chunks parsed, "
+          f"{len(front_end.lexer_errors)} lexical, {len(front_end.parser_errors)} syntax and "
+          f"{len(front_end.semantic_errors)} semantic errors")
+    print(f"serial:   {serial:.2f}s")
+    print(f"parallel: {parallel:.2f}s with {workers} workers ({serial / parallel:.1f}x), "
+          f"{parent_cpu:.2f}s CPU in this process")
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -1,15 +1,75 @@
+import sys
+from collections import deque
+from ast_nodes import (Query, CreateStmt, ColumnDef, InsertStmt, SelectStmt, UpdateStmt, Assignment, DeleteStmt,
+                       Identifier, Literal, ErrorExpr, Paren, BinaryOp, Comparison, LogicalOp, Not,
+                       ADDITIVE_OPS, MULTIPLICATIVE_OPS, chain)
+from lexer import FIXED_LEXEMES
+
+LITERAL_KINDS = {'NUMBER_LITERAL': 'NUMBER', 'STRING_LITERAL': 'STRING'}
+PARSER_MODES = ('descent', 'pratt')
+# Binding power of the binary operators for the 'pratt' mode; all of them are
+# left-associative.
+ARITHMETIC_PRECEDENCE = {'PLUS': 1, 'MINUS': 1, 'MULTIPLY': 2, 'DIVIDE': 2, 'MODULO': 2}
+LOGICAL_PRECEDENCE = {'OR': 1, 'AND': 2}
+# Tokens error recovery skips to: the end of a statement or the start of one.
+SYNC_TOKENS = frozenset({'SEMICOLON', 'SELECT', 'INSERT', 'UPDATE', 'DELETE', 'CREATE'})
+
+def last_flags(items):
+    # (item, is_last) pairs, for drawing tree connectors.
+    return [(item, i == len(items) - 1) for i, item in enumerate(items)]
+
+def tree_lines(node, label=str, prefix="", indent="", max_depth=None, max_nodes=None):
+    # The lines (newline included) drawing the ParseNode tree under `node`,
+    # produced depth first from an explicit stack, so output of any size
+    # streams in linear time. The root's children are drawn `indent` further
+    # in. Children of nodes at max_depth are shown as a single "..." line,
+    # and drawing stops after max_nodes nodes.
+    yield prefix + label(node) + "\n"
+    count = 1
+    stack = [(child, prefix + indent, is_last, 1) for child, is_last in reversed(last_flags(node.children))]
+    while stack:
+        if max_nodes is not None and count >= max_nodes:
+            yield f"... (output cut at {max_nodes} nodes)\n"
+            return
+        node, prefix, is_last, depth = stack.pop()
+        yield prefix + ("└── " if is_last else "├── ") + label(node) + "\n"
+        count += 1
+        child_prefix = prefix + ("    " if is_last else "│   ")
+        if max_depth is not None and depth >= max_depth:
+            if node.children:
+                yield child_prefix + "└── ...\n"
+            continue
+        stack.extend((child, child_prefix, last, depth + 1) for child, last in reversed(last_flags(node.children)))
+
+def token_span(token):
+    return (token[2], token[3], token[2], token[3])
+
 class ParseNode:
-    def __init__(self, name, value=None, children=None):
+    # Display form of the typed tree (see to_parse_tree); `source` is the
+    # ast_nodes node it was rendered from, if any.
+    def __init__(self, name, value=None, children=None, source=None):
         self.name, self.value, self.children = name, value, children if children else []
+        self.source = source
     def add_child(self, child):
         self.children.append(child)
     def __repr__(self):
         return f"{self.name}({self.value})" if self.value else self.name
 
 class Parser:
-    def __init__(self, tokens):
-        self.tokens, self.pos, self.errors, self.parse_tree = tokens, 0, [], None
-        self.sync_tokens = {'SEMICOLON', 'SELECT', 'INSERT', 'UPDATE', 'DELETE', 'CREATE'}
+    # mode='descent' parses expressions and conditions with one method per
+    # precedence level; mode='pratt' climbs precedence in a single loop and
+    # skips the calls for levels that have no operator. Both build the same
+    # tree and report the same errors.
+    sync_tokens = SYNC_TOKENS
+    
+    def __init__(self, tokens, mode='pratt'):
+        if mode not in PARSER_MODES:
+            raise ValueError(f"Unknown parser mode '{mode}', expected one of {', '.join(PARSER_MODES)}.")
+        self.mode = mode
+        self.reset(tokens)
+    
+    def reset(self, tokens):
+        self.tokens, self.pos, self.errors, self.parse_tree, self.ast = tokens, 0, [], None, None
     
     def current(self):
         return self.tokens[self.pos] if self.pos < len(self.tokens) else None
@@ -39,272 +99,523 @@ class Parser:
                 return
             self.advance()
     
-    def add_token_node(self, node, token_type, display_name=None):
-        if (t := self.expect(token_type)):
-            node.add_child(ParseNode(display_name or token_type, t[1] if token_type == 'IDENTIFIER' else display_name or token_type))
+    def expect_terminal(self, missing, token_type, display_name=None):
+        # Records the terminal (as named in the parse tree) when it is missing.
+        if not self.expect(token_type):
+            missing.append(display_name or token_type)
+    
+    def expect_identifier(self):
+        if (t := self.expect('IDENTIFIER')):
+            return Identifier(t[1], span=token_span(t))
+        return None
+    
+    def previous(self):
+        return self.tokens[self.pos - 1]
+    
+    def mark(self):
+        return self.pos, self.current()
+    
+    def span(self, mark):
+        # From the first token at `mark` to the last token consumed since.
+        pos, first = mark
+        if self.pos == pos or first is None:
+            return None
+        last = self.previous()
+        return (first[2], first[3], last[2], last[3])
     
     def parse(self):
-        self.parse_tree = ParseNode("Query")
+        self.parse_tree = to_parse_tree(self.parse_ast())
+        return self.parse_tree
+    
+    def parse_ast(self):
+        self.ast = Query(list(self.iter_statements()))
+        return self.ast
+    
+    def iter_statements(self):
         while self.current() and self.current()[0] in ['SELECT', 'INSERT', 'UPDATE', 'DELETE', 'CREATE']:
             try:
-                if stmt := self.parse_statement():
-                    self.parse_tree.add_child(stmt)
+                stmt = self.parse_statement()
             except Exception as e:
+                stmt = None
                 token = self.current()
                 if token:
                     self.errors.append(f"Syntax Error: Unexpected error at line {token[2]}, column {token[3]}: {str(e)}")
                 self.synchronize()
-        if self.pos < len(self.tokens):
-            t = self.current()
-            if t[0] not in self.sync_tokens:
-                self.errors.append(f"Syntax Error: Unexpected token '{t[1]}' at line {t[2]}, column {t[3]}.")
-        return self.parse_tree
+            if stmt:
+                yield stmt
+        if (t := self.current()) and t[0] not in self.sync_tokens:
+            self.errors.append(f"Syntax Error: Unexpected token '{t[1]}' at line {t[2]}, column {t[3]}.")
     
     def parse_statement(self):
-        node, token = ParseNode("Statement"), self.current()
+        token = self.current()
         if not token:
             return None
-        stmt_map = {'CREATE': self.parse_create, 'INSERT': self.parse_insert, 
-                    'SELECT': self.parse_select, 'UPDATE': self.parse_update, 'DELETE': self.parse_delete}
-        if token[0] in stmt_map:
-            if stmt := stmt_map[token[0]]():
-                node.add_child(stmt)
+        parse = STATEMENT_PARSERS.get(token[0])
+        if parse:
+            stmt = parse(self)
         else:
             self.errors.append(f"Syntax Error: Unexpected statement starting with '{token[1]}' at line {token[2]}, column {token[3]}.")
             self.synchronize()
             return None
         if not self.expect('SEMICOLON'):
             self.synchronize()
-            return node
-        node.add_child(ParseNode("SEMICOLON", ";"))
-        return node
+            stmt.terminated = False
+        return stmt
     
     def parse_create(self):
-        node = ParseNode("CreateStmt")
-        self.add_token_node(node, 'CREATE', 'CREATE')
-        self.add_token_node(node, 'TABLE', 'TABLE')
-        self.add_token_node(node, 'IDENTIFIER')
-        self.add_token_node(node, 'LPAREN', 'LEFT_PAREN')
-        node.add_child(self.parse_column_list())
-        self.add_token_node(node, 'RPAREN', 'RIGHT_PAREN')
-        return node
+        mark, missing = self.mark(), []
+        self.expect_terminal(missing, 'CREATE')
+        self.expect_terminal(missing, 'TABLE')
+        table = self.expect_identifier()
+        self.expect_terminal(missing, 'LPAREN', 'LEFT_PAREN')
+        columns = self.parse_column_list()
+        self.expect_terminal(missing, 'RPAREN', 'RIGHT_PAREN')
+        return CreateStmt(table, columns, tuple(missing), span=self.span(mark))
     
     def parse_column_list(self):
-        node = ParseNode("ColumnList")
-        node.add_child(self.parse_column_def())
+        columns = [self.parse_column_def()]
         while self.current() and self.current()[0] == 'COMMA':
             self.advance()
-            node.add_child(ParseNode("COMMA", ","))
-            node.add_child(self.parse_column_def())
-        return node
+            columns.append(self.parse_column_def())
+        return columns
     
     def parse_column_def(self):
-        node = ParseNode("ColumnDef")
-        self.add_token_node(node, 'IDENTIFIER')
+        mark, data_type = self.mark(), None
+        name = self.expect_identifier()
         if (t := self.current()) and t[0] in ['INT', 'FLOAT', 'TEXT']:
             self.advance()
-            node.add_child(ParseNode("DataType", t[0]))
+            data_type = t[0]
         else:
             if t:
                 self.errors.append(f"Syntax Error: Expected data type (INT, FLOAT, or TEXT) at line {t[2]}, column {t[3]}, but found '{t[1]}'.")
             else:
                 self.errors.append(f"Syntax Error: Expected data type (INT, FLOAT, or TEXT), but reached end of input.")
-        return node
+        return ColumnDef(name, data_type, self.span(mark))
     
     def parse_insert(self):
-        node = ParseNode("InsertStmt")
-        self.add_token_node(node, 'INSERT', 'INSERT')
-        self.add_token_node(node, 'INTO', 'INTO')
-        self.add_token_node(node, 'IDENTIFIER')
-        self.add_token_node(node, 'VALUES', 'VALUES')
-        self.add_token_node(node, 'LPAREN', 'LEFT_PAREN')
-        node.add_child(self.parse_value_list())
-        self.add_token_node(node, 'RPAREN', 'RIGHT_PAREN')
-        return node
+        mark, missing = self.mark(), []
+        self.expect_terminal(missing, 'INSERT')
+        self.expect_terminal(missing, 'INTO')
+        table = self.expect_identifier()
+        self.expect_terminal(missing, 'VALUES')
+        self.expect_terminal(missing, 'LPAREN', 'LEFT_PAREN')
+        values = self.parse_value_list()
+        self.expect_terminal(missing, 'RPAREN', 'RIGHT_PAREN')
+        return InsertStmt(table, values, tuple(missing), span=self.span(mark))
     
-    def parse_value_list(self):
-        node = ParseNode("ValueList")
+    def parse_value(self):
         if (t := self.current()) and t[0] in ['STRING_LITERAL', 'NUMBER_LITERAL']:
             self.advance()
-            node.add_child(ParseNode("Value", f"{t[0]}:{t[1]}"))
+            return Literal(LITERAL_KINDS[t[0]], t[1], token_span(t))
+        return None
+    
+    def parse_value_list(self):
+        values = [self.parse_value()]
         while self.current() and self.current()[0] == 'COMMA':
             self.advance()
-            node.add_child(ParseNode("COMMA", ","))
-            if (t := self.current()) and t[0] in ['STRING_LITERAL', 'NUMBER_LITERAL']:
-                self.advance()
-                node.add_child(ParseNode("Value", f"{t[0]}:{t[1]}"))
-        return node
+            values.append(self.parse_value())
+        return values
     
     def parse_select(self):
-        node = ParseNode("SelectStmt")
-        self.add_token_node(node, 'SELECT', 'SELECT')
-        node.add_child(self.parse_select_list())
-        self.add_token_node(node, 'FROM', 'FROM')
-        self.add_token_node(node, 'IDENTIFIER')
+        mark, missing, where = self.mark(), [], None
+        self.expect_terminal(missing, 'SELECT')
+        columns = self.parse_select_list()
+        self.expect_terminal(missing, 'FROM')
+        table = self.expect_identifier()
         if self.current() and self.current()[0] == 'WHERE':
-            node.add_child(self.parse_where())
-        return node
+            where = self.parse_where()
+        return SelectStmt(columns, table, where, tuple(missing), span=self.span(mark))
     
     def parse_select_list(self):
-        node = ParseNode("SelectList")
         if self.current() and self.current()[0] == 'MULTIPLY':
             self.advance()
-            node.add_child(ParseNode("MULTIPLY", "*"))
-        else:
-            node.add_child(self.parse_expr_list())
-        return node
+            return None
+        return self.parse_expr_list()
     
     def parse_expr_list(self):
-        node = ParseNode("ExpressionList")
-        node.add_child(self.parse_expression())
+        exprs = [self.parse_expression()]
         while self.current() and self.current()[0] == 'COMMA':
             self.advance()
-            node.add_child(ParseNode("COMMA", ","))
-            node.add_child(self.parse_expression())
-        return node
+            exprs.append(self.parse_expression())
+        return exprs
     
     def parse_expression(self):
-        node = ParseNode("Expression")
-        node.add_child(self.parse_term())
+        if self.mode == 'pratt':
+            return self.parse_arithmetic()
+        mark = self.mark()
+        node = self.parse_term()
         while self.current() and self.current()[0] in ['PLUS', 'MINUS']:
             op = self.current()
             self.advance()
-            node.add_child(ParseNode(op[0], op[1]))
-            node.add_child(self.parse_term())
+            node = BinaryOp(op[0], node, self.parse_term(), self.span(mark))
         return node
     
     def parse_term(self):
-        node = ParseNode("Term")
-        node.add_child(self.parse_factor())
+        mark = self.mark()
+        node = self.parse_factor()
         while self.current() and self.current()[0] in ['MULTIPLY', 'DIVIDE', 'MODULO']:
             op = self.current()
             self.advance()
-            node.add_child(ParseNode(op[0], op[1]))
-            node.add_child(self.parse_factor())
+            node = BinaryOp(op[0], node, self.parse_factor(), self.span(mark))
         return node
     
     def parse_factor(self):
         token = self.current()
         if not token:
             self.errors.append("Syntax Error: Expected factor (identifier, number, string, or parenthesized expression), but reached end of input.")
-            return ParseNode("Factor", "ERROR")
-        if token[0] in ['IDENTIFIER', 'NUMBER_LITERAL', 'STRING_LITERAL']:
+            return ErrorExpr()
+        if token[0] == 'IDENTIFIER':
+            self.advance()
+            return Identifier(token[1], span=token_span(token))
+        elif token[0] in ['NUMBER_LITERAL', 'STRING_LITERAL']:
             self.advance()
-            type_map = {'IDENTIFIER': 'IDENTIFIER', 'NUMBER_LITERAL': 'NUMBER', 'STRING_LITERAL': 'STRING'}
-            return ParseNode("Factor", f"{type_map[token[0]]}:{token[1]}")
+            return Literal(LITERAL_KINDS[token[0]], token[1], token_span(token))
         elif token[0] == 'LPAREN':
-            node = ParseNode("Factor")
+            mark = self.mark()
             self.advance()
-            node.add_child(ParseNode("LPAREN", "("))
-            node.add_child(self.parse_expression())
-            if self.expect('RPAREN'):
-                node.add_child(ParseNode("RPAREN", ")"))
-            return node
+            expr = self.parse_expression()
+            closed = self.expect('RPAREN') is not None
+            return Paren(expr, closed, self.span(mark))
         self.errors.append(f"Syntax Error: Expected factor (identifier, number, string, or '(') at line {token[2]}, column {token[3]}, but found '{token[1]}'.")
-        return ParseNode("Factor", "ERROR")
+        return ErrorExpr(token_span(token))
+    
+    def parse_climbing(self, precedence, parse_operand, node_type, min_precedence=1):
+        node = parse_operand()
+        while (t := self.current()) and precedence.get(t[0], 0) >= min_precedence:
+            self.advance()
+            right = self.parse_climbing(precedence, parse_operand, node_type, precedence[t[0]] + 1)
+            # The span starts with the left operand, or with the operator if
+            # that consumed no tokens, so no mark is taken per operand (the
+            # same goes for reduce()).
+            first, last = node.span or (t[2], t[3]), self.previous()
+            node = node_type(t[0], node, right, (first[0], first[1], last[2], last[3]))
+        return node
+    
+    def parse_arithmetic(self):
+        # Operator precedence parsing with explicit operand/operator stacks and
+        # a stack of the enclosing parentheses' frames, so nesting depth is not
+        # bounded by the recursion limit.
+        frames, opener, operands, operators = [], None, [], []
+        while True:
+            token = self.current()
+            if token and token[0] == 'LPAREN':
+                self.advance()
+                frames.append((opener, operands, operators))
+                opener, operands, operators = token, [], []
+                continue
+            operands.append(self.parse_factor())
+            while True:
+                t = self.current()
+                precedence = ARITHMETIC_PRECEDENCE.get(t[0], 0) if t else 0
+                while operators and ARITHMETIC_PRECEDENCE[operators[-1][0]] >= precedence:
+                    self.reduce(operands, operators)
+                if precedence:
+                    self.advance()
+                    operators.append(t)
+                    break
+                if opener is None:
+                    return operands[0]
+                closed = self.expect('RPAREN') is not None
+                last = self.previous()
+                node = Paren(operands[0], closed, (opener[2], opener[3], last[2], last[3]))
+                opener, operands, operators = frames.pop()
+                operands.append(node)
+    
+    def reduce(self, operands, operators):
+        op, right, left = operators.pop(), operands.pop(), operands.pop()
+        first, last = left.span or (op[2], op[3]), self.previous()
+        operands.append(BinaryOp(op[0], left, right, (first[0], first[1], last[2], last[3])))
     
     def parse_update(self):
-        node = ParseNode("UpdateStmt")
-        self.add_token_node(node, 'UPDATE', 'UPDATE')
-        self.add_token_node(node, 'IDENTIFIER')
-        self.add_token_node(node, 'SET', 'SET')
-        node.add_child(self.parse_assignment_list())
+        mark, missing, where = self.mark(), [], None
+        self.expect_terminal(missing, 'UPDATE')
+        table = self.expect_identifier()
+        self.expect_terminal(missing, 'SET')
+        assignments = self.parse_assignment_list()
         if self.current() and self.current()[0] == 'WHERE':
-            node.add_child(self.parse_where())
-        return node
+            where = self.parse_where()
+        return UpdateStmt(table, assignments, where, tuple(missing), span=self.span(mark))
     
     def parse_assignment_list(self):
-        node = ParseNode("AssignmentList")
-        node.add_child(self.parse_assignment())
+        assignments = [self.parse_assignment()]
         while self.current() and self.current()[0] == 'COMMA':
             self.advance()
-            node.add_child(ParseNode("COMMA", ","))
-            node.add_child(self.parse_assignment())
-        return node
+            assignments.append(self.parse_assignment())
+        return assignments
     
     def parse_assignment(self):
-        node = ParseNode("Assignment")
-        self.add_token_node(node, 'IDENTIFIER')
-        self.add_token_node(node, 'EQUAL', 'EQUAL')
-        node.add_child(self.parse_expression())
-        return node
+        mark, missing = self.mark(), []
+        column = self.expect_identifier()
+        self.expect_terminal(missing, 'EQUAL')
+        value = self.parse_expression()
+        return Assignment(column, value, tuple(missing), self.span(mark))
     
     def parse_delete(self):
-        node = ParseNode("DeleteStmt")
-        self.add_token_node(node, 'DELETE', 'DELETE')
-        self.add_token_node(node, 'FROM', 'FROM')
-        self.add_token_node(node, 'IDENTIFIER')
+        mark, missing, where = self.mark(), [], None
+        self.expect_terminal(missing, 'DELETE')
+        self.expect_terminal(missing, 'FROM')
+        table = self.expect_identifier()
         if self.current() and self.current()[0] == 'WHERE':
-            node.add_child(self.parse_where())
-        return node
+            where = self.parse_where()
+        return DeleteStmt(table, where, tuple(missing), span=self.span(mark))
     
     def parse_where(self):
-        node = ParseNode("WhereClause")
-        self.add_token_node(node, 'WHERE', 'WHERE')
-        node.add_child(self.parse_condition())
-        return node
+        # Only called on a WHERE token; the clause is just its condition.
+        self.expect('WHERE')
+        return self.parse_condition()
     
     def parse_condition(self):
-        node = ParseNode("Condition")
-        node.add_child(self.parse_and_condition())
+        if self.mode == 'pratt':
+            return self.parse_climbing(LOGICAL_PRECEDENCE, self.parse_not_condition, LogicalOp)
+        mark = self.mark()
+        node = self.parse_and_condition()
         while self.current() and self.current()[0] == 'OR':
             self.advance()
-            node.add_child(ParseNode("OR", "OR"))
-            node.add_child(self.parse_and_condition())
+            node = LogicalOp('OR', node, self.parse_and_condition(), self.span(mark))
         return node
     
     def parse_and_condition(self):
-        node = ParseNode("AndCondition")
-        node.add_child(self.parse_not_condition())
+        mark = self.mark()
+        node = self.parse_not_condition()
         while self.current() and self.current()[0] == 'AND':
             self.advance()
-            node.add_child(ParseNode("AND", "AND"))
-            node.add_child(self.parse_not_condition())
+            node = LogicalOp('AND', node, self.parse_not_condition(), self.span(mark))
         return node
     
     def parse_not_condition(self):
-        node = ParseNode("NotCondition")
         if self.current() and self.current()[0] == 'NOT':
+            mark = self.mark()
             self.advance()
-            node.add_child(ParseNode("NOT", "NOT"))
             if self.current() and self.current()[0] == 'IDENTIFIER':
                 next_tok = self.peek()
                 if next_tok and next_tok[0] not in ['EQUAL', 'NOT_EQUAL', 'LESS_THAN', 'GREATER_THAN', 'LESS_EQUAL', 'GREATER_EQUAL']:
                     t = self.current()
                     self.advance()
-                    node.add_child(ParseNode("BooleanExpr", f"IDENTIFIER:{t[1]}"))
-                    return node
-        node.add_child(self.parse_comparison())
-        return node
+                    return Not(Identifier(t[1], span=token_span(t)), self.span(mark))
+            operand = self.parse_comparison()
+            return Not(operand, self.span(mark))
+        return self.parse_comparison()
     
     def parse_comparison(self):
-        node = ParseNode("Comparison")
-        node.add_child(self.parse_expression())
+        mark, op = self.mark(), None
+        left = self.parse_expression()
         if (t := self.current()) and t[0] in ['EQUAL', 'NOT_EQUAL', 'LESS_THAN', 'GREATER_THAN', 'LESS_EQUAL', 'GREATER_EQUAL']:
             self.advance()
-            node.add_child(ParseNode("ComparisonOp", t[1]))
+            op = t[1]
         elif t:
             self.errors.append(f"Syntax Error: Expected comparison operator (=, !=, <, >, <=, >=) at line {t[2]}, column {t[3]}, but found '{t[1]}'.")
         else:
             self.errors.append(f"Syntax Error: Expected comparison operator (=, !=, <, >, <=, >=), but reached end of input.")
-        node.add_child(self.parse_expression())
-        return node
+        right = self.parse_expression()
+        return Comparison(left, op, right, self.span(mark))
     
-    def print_tree(self, node=None, prefix=""):
+    def print_tree(self, node=None, prefix="", file=None, max_depth=None, max_nodes=None):
         if node is None:
             node = self.parse_tree
         if node is None:
             return
-        print(node if not prefix else prefix + str(node))
-        for i, child in enumerate(node.children):
-            is_last = (i == len(node.children) - 1)
-            new_prefix = ("├── " if not is_last else "└── ") if not prefix else prefix + ("├── " if not is_last else "└── ")
-            next_prefix = ("│   " if not is_last else "    ") if not prefix else prefix + ("│   " if not is_last else "    ")
-            print(new_prefix + str(child))
-            self._print_subtree(child, next_prefix)
-    
-    def _print_subtree(self, node, prefix):
-        for i, child in enumerate(node.children):
-            is_last = (i == len(node.children) - 1)
-            print(prefix + ("├── " if not is_last else "└── ") + str(child))
-            self._print_subtree(child, prefix + ("│   " if not is_last else "    "))
+        (file or sys.stdout).writelines(tree_lines(node, prefix=prefix, max_depth=max_depth, max_nodes=max_nodes))
+
+
+
+STATEMENT_PARSERS = {'CREATE': Parser.parse_create, 'INSERT': Parser.parse_insert, 'SELECT': Parser.parse_select,
+                     'UPDATE': Parser.parse_update, 'DELETE': Parser.parse_delete}
+
+def to_parse_tree(query):
+    return ParseTreeRenderer().render(query)
+
+class ParseTreeRenderer:
+    # Renders the typed tree as the generic ParseNode tree shown by the web UI
+    # and print_tree: terminals appear as nodes, missing ones are left out.
+    # Parenthesized expressions are rendered from a work list rather than by
+    # recursion, so any nesting depth the parser accepts can be rendered.
+    def __init__(self):
+        self.pending = []
+    
+    def render(self, query):
+        root = ParseNode("Query", children=[self.render_statement(stmt) for stmt in query.statements])
+        while self.pending:
+            node, expr = self.pending.pop()
+            self.render_expression(expr, node)
+        return root
+    
+    def render_statement(self, stmt):
+        node = ParseNode("Statement", children=[STATEMENT_RENDERERS[type(stmt)](self, stmt)])
+        if stmt.terminated:
+            node.add_child(ParseNode("SEMICOLON", ";"))
+        return node
+    
+    @staticmethod
+    def add_terminals(children, stmt, *names):
+        children.extend(ParseNode(name, name) for name in names if name not in stmt.missing)
+    
+    @staticmethod
+    def add_identifier(children, ident):
+        if ident:
+            children.append(ParseNode("IDENTIFIER", ident.name, source=ident))
+    
+    @staticmethod
+    def add_separated(node, items, render):
+        for i, item in enumerate(items):
+            if i:
+                node.add_child(ParseNode("COMMA", ","))
+            if (child := render(item)):
+                node.add_child(child)
+        return node
+    
+    def render_create(self, stmt):
+        children = []
+        self.add_terminals(children, stmt, 'CREATE', 'TABLE')
+        self.add_identifier(children, stmt.table)
+        self.add_terminals(children, stmt, 'LEFT_PAREN')
+        children.append(self.add_separated(ParseNode("ColumnList"), stmt.columns, self.render_column_def))
+        self.add_terminals(children, stmt, 'RIGHT_PAREN')
+        return ParseNode("CreateStmt", children=children, source=stmt)
+    
+    def render_column_def(self, column):
+        children = []
+        self.add_identifier(children, column.name)
+        if column.data_type:
+            children.append(ParseNode("DataType", column.data_type))
+        return ParseNode("ColumnDef", children=children, source=column)
+    
+    def render_insert(self, stmt):
+        children = []
+        self.add_terminals(children, stmt, 'INSERT', 'INTO')
+        self.add_identifier(children, stmt.table)
+        self.add_terminals(children, stmt, 'VALUES', 'LEFT_PAREN')
+        children.append(self.add_separated(ParseNode("ValueList"), stmt.values, self.render_value))
+        self.add_terminals(children, stmt, 'RIGHT_PAREN')
+        return ParseNode("InsertStmt", children=children, source=stmt)
+    
+    def render_value(self, value):
+        return ParseNode("Value", f"{value.kind}_LITERAL:{value.value}", source=value) if value else None
+    
+    def render_select(self, stmt):
+        children = []
+        self.add_terminals(children, stmt, 'SELECT')
+        if stmt.columns is None:
+            children.append(ParseNode("SelectList", children=[ParseNode("MULTIPLY", "*")]))
+        else:
+            expressions = self.add_separated(ParseNode("ExpressionList"), stmt.columns, self.render_expression)
+            children.append(ParseNode("SelectList", children=[expressions]))
+        self.add_terminals(children, stmt, 'FROM')
+        self.add_identifier(children, stmt.table)
+        self.add_where(children, stmt.where)
+        return ParseNode("SelectStmt", children=children, source=stmt)
+    
+    def render_update(self, stmt):
+        children = []
+        self.add_terminals(children, stmt, 'UPDATE')
+        self.add_identifier(children, stmt.table)
+        self.add_terminals(children, stmt, 'SET')
+        children.append(self.add_separated(ParseNode("AssignmentList"), stmt.assignments, self.render_assignment))
+        self.add_where(children, stmt.where)
+        return ParseNode("UpdateStmt", children=children, source=stmt)
+    
+    def render_assignment(self, assignment):
+        children = []
+        self.add_identifier(children, assignment.column)
+        self.add_terminals(children, assignment, 'EQUAL')
+        children.append(self.render_expression(assignment.value))
+        return ParseNode("Assignment", children=children, source=assignment)
+    
+    def render_delete(self, stmt):
+        children = []
+        self.add_terminals(children, stmt, 'DELETE', 'FROM')
+        self.add_identifier(children, stmt.table)
+        self.add_where(children, stmt.where)
+        return ParseNode("DeleteStmt", children=children, source=stmt)
+    
+    def add_where(self, children, where):
+        if where:
+            children.append(ParseNode("WhereClause", children=[ParseNode("WHERE", "WHERE"), self.render_condition(where)]))
+    
+    @staticmethod
+    def render_chain(node, chained, ops, render):
+        for i, item in enumerate(chain(chained, ops)):
+            node.add_child(render(item) if i % 2 == 0 else ParseNode(item, FIXED_LEXEMES[item]))
+        node.source = chained
+        return node
+    
+    def render_expression(self, expr, node=None):
+        return self.render_chain(node or ParseNode("Expression"), expr, ADDITIVE_OPS, self.render_term)
+    
+    def render_term(self, term):
+        return self.render_chain(ParseNode("Term"), term, MULTIPLICATIVE_OPS, self.render_factor)
+    
+    def render_factor(self, factor):
+        if isinstance(factor, Identifier):
+            return ParseNode("Factor", f"IDENTIFIER:{factor.name}", source=factor)
+        if isinstance(factor, Literal):
+            return ParseNode("Factor", f"{factor.kind}:{factor.value}", source=factor)
+        if isinstance(factor, Paren):
+            # Filled in by render() once the enclosing expression is done.
+            inner = ParseNode("Expression")
+            self.pending.append((inner, factor.expr))
+            children = [ParseNode("LPAREN", "("), inner]
+            if factor.closed:
+                children.append(ParseNode("RPAREN", ")"))
+            return ParseNode("Factor", children=children, source=factor)
+        return ParseNode("Factor", "ERROR", source=factor)
+    
+    def render_condition(self, condition):
+        return self.render_chain(ParseNode("Condition"), condition, ('OR',), self.render_and_condition)
+    
+    def render_and_condition(self, condition):
+        return self.render_chain(ParseNode("AndCondition"), condition, ('AND',), self.render_not_condition)
+    
+    def render_not_condition(self, condition):
+        if not isinstance(condition, Not):
+            return ParseNode("NotCondition", children=[self.render_comparison(condition)], source=condition)
+        operand = condition.operand
+        if isinstance(operand, Identifier):
+            rendered = ParseNode("BooleanExpr", f"IDENTIFIER:{operand.name}", source=operand)
+        else:
+            rendered = self.render_comparison(operand)
+        return ParseNode("NotCondition", children=[ParseNode("NOT", "NOT"), rendered], source=condition)
+    
+    def render_comparison(self, comparison):
+        children = [self.render_expression(comparison.left)]
+        if comparison.op:
+            children.append(ParseNode("ComparisonOp", comparison.op))
+        children.append(self.render_expression(comparison.right))
+        return ParseNode("Comparison", children=children, source=comparison)
+
+STATEMENT_RENDERERS = {CreateStmt: ParseTreeRenderer.render_create, InsertStmt: ParseTreeRenderer.render_insert,
+                       SelectStmt: ParseTreeRenderer.render_select, UpdateStmt: ParseTreeRenderer.render_update,
+                       DeleteStmt: ParseTreeRenderer.render_delete}
+
+class StreamParser(Parser):
+    # Consumes any token iterator (e.g. a StreamLexer) keeping at most
+    # `lookahead` tokens buffered. Use iter_statements() to handle statements
+    # one at a time; parse() still builds the whole Query tree.
+    def __init__(self, tokens, lookahead=2, mode='pratt'):
+        super().__init__([], mode)
+        self.stream = iter(tokens)
+        self.window = deque(maxlen=lookahead)
+        self.last = None
+    
+    def fill(self, count):
+        while len(self.window) < count:
+            token = next(self.stream, None)
+            if token is None:
+                return False
+            self.window.append(token)
+        return True
+    
+    def current(self):
+        return self.window[0] if self.fill(1) else None
+    
+    def peek(self, offset=1):
+        if offset >= self.window.maxlen:
+            raise ValueError(f"Lookahead of {offset} exceeds the stream window of {self.window.maxlen} tokens.")
+        return self.window[offset] if self.fill(offset + 1) else None
+    
+    def previous(self):
+        return self.last
+    
+    def advance(self):
+        if self.fill(1):
+            self.last = self.window.popleft()
+        self.pos += 1
@@ -1,120 +1,146 @@
+from ast_nodes import (CreateStmt, InsertStmt, SelectStmt, UpdateStmt, DeleteStmt, Identifier, Literal,
+                       BinaryOp, Paren, Comparison, LogicalOp, Not, ADDITIVE_OPS)
+from parser import to_parse_tree, tree_lines
+
 class SemanticAnalyzer:
-    def __init__(self, parse_tree, tokens):
+    def __init__(self, parse_tree, catalog=None):
+        self.reset(parse_tree, catalog)
+    
+    def reset(self, parse_tree, catalog=None):
         self.parse_tree = parse_tree
-        self.tokens = tokens
         self.errors = []
-        self.symbol_table = {}
-        self.token_map = self._build_token_map()
-    
-    def _build_token_map(self):
-        token_map = {}
-        for token in self.tokens:
-            token_type, value, line, col = token
-            if value not in token_map:
-                token_map[value] = {'line': line, 'col': col, 'type': token_type}
-        return token_map
-    
-    def get_token_info(self, value):
-        if value in self.token_map:
-            return self.token_map[value]
-        return {'line': 0, 'col': 0, 'type': 'UNKNOWN'}
+        # Tables preloaded from a catalog (see catalog.py) are shared with it
+        # and only copied once the script declares tables of its own.
+        self.catalog = catalog
+        self.symbol_table = catalog.tables if catalog else {}
+        # Column name -> (table, type) of the first table declaring it.
+        self.column_index = catalog.column_index if catalog else {}
+    
+    def get_token_info(self, node, end=False):
+        # Position of the node's first (or last) token, from its span.
+        if node is None or node.span is None:
+            return {'line': 0, 'col': 0}
+        line, col, end_line, end_col = node.span
+        return {'line': end_line, 'col': end_col} if end else {'line': line, 'col': col}
     
     def analyze(self):
         if not self.parse_tree:
             return self.errors
         
-        for stmt_node in self.parse_tree.children:
-            if stmt_node.name == "Statement":
-                for child in stmt_node.children:
-                    if child.name == "CreateStmt":
-                        self._process_create(child)
-        
-        for stmt_node in self.parse_tree.children:
-            if stmt_node.name == "Statement":
-                for child in stmt_node.children:
-                    if child.name == "InsertStmt":
-                        self._process_insert(child)
-                    elif child.name == "SelectStmt":
-                        self._process_select(child)
-                    elif child.name == "UpdateStmt":
-                        self._process_update(child)
-                    elif child.name == "DeleteStmt":
-                        self._process_delete(child)
-        
+        # A single pass in statement order. CREATE TABLE errors still come
+        # first and the other checks follow in statement order; a statement
+        # whose table is only declared further down (a forward reference) is
+        # set aside and checked after the pass, its errors going back in at
+        # its place. Tables never change once declared, so every other
+        # statement sees the same definitions as after a full declaring pass.
+        # Statements without a table wait too, as their columns resolve
+        # against every table.
+        create_errors, check_errors, deferred = self.errors, [], []
+        checks = self.CHECKS
+        self.errors = check_errors
+        for stmt in self.parse_tree.statements:
+            kind = type(stmt)
+            if kind is CreateStmt:
+                self.errors = create_errors
+                self._process_create(stmt)
+                self.errors = check_errors
+            elif kind in checks:
+                table_of, check = checks[kind]
+                table_name = table_of(stmt)
+                if not table_name or table_name not in self.symbol_table:
+                    deferred.append((len(check_errors), stmt))
+                else:
+                    check(self, stmt)
+                    self._resolve_columns(stmt, table_name)
+        
+        done = 0
+        self.errors = create_errors
+        for at, stmt in deferred:
+            create_errors.extend(check_errors[done:at])
+            done = at
+            self.check_statement(stmt)
+        create_errors.extend(check_errors[done:])
         return self.errors
     
+    def declare_tables(self, stmt):
+        if type(stmt) is CreateStmt:
+            self._process_create(stmt)
+    
+    def check_statement(self, stmt):
+        if entry := self.CHECKS.get(type(stmt)):
+            table_of, check = entry
+            check(self, stmt)
+            self._resolve_columns(stmt, table_of(stmt))
+    
+    @staticmethod
+    def _named_table(stmt):
+        return stmt.table.name if stmt.table else None
+    
+    @staticmethod
+    def _from_table(stmt):
+        # SELECT and DELETE only name their table after a FROM.
+        if stmt.table and 'FROM' not in stmt.missing:
+            return stmt.table.name
+        return None
+    
+    @classmethod
+    def referenced_tables(cls, stmt):
+        # Table names check_statement() looks up.
+        entry = cls.CHECKS.get(type(stmt))
+        table_name = entry[0](stmt) if entry else None
+        return [table_name] if table_name else []
+    
     def _process_create(self, node):
-        table_name = None
         columns = {}
         
-        for child in node.children:
-            if child.name == "IDENTIFIER":
-                table_name = child.value
-                break
-        
-        if not table_name:
+        if not node.table:
             return
+        table_name = node.table.name
         
         if table_name in self.symbol_table:
-            token_info = self.get_token_info(table_name)
+            token_info = self.get_token_info(node.table)
             self.errors.append(
                 f"Semantic Error: Table '{table_name}' is already declared at line {token_info['line']}, column {token_info['col']}."
             )
             return
         
-        for child in node.children:
-            if child.name == "ColumnList":
-                self._extract_columns(child, columns)
+        self._extract_columns(node, columns)
         
+        if self.catalog and self.symbol_table is self.catalog.tables:
+            self.symbol_table, self.column_index = dict(self.symbol_table), dict(self.column_index)
         self.symbol_table[table_name] = {'columns': columns}
+        for col_name, col_type in columns.items():
+            self.column_index.setdefault(col_name, (table_name, col_type))
     
     def _extract_columns(self, node, columns):
-        for child in node.children:
-            if child.name == "ColumnDef":
-                col_name = None
-                col_type = None
-                
-                for subchild in child.children:
-                    if subchild.name == "IDENTIFIER":
-                        col_name = subchild.value
-                    elif subchild.name == "DataType":
-                        col_type = subchild.value
-                
-                if col_name and col_type:
-                    if col_type not in ['INT', 'FLOAT', 'TEXT']:
-                        token_info = self.get_token_info(col_type)
-                        self.errors.append(
-                            f"Semantic Error: Invalid data type '{col_type}' at line {token_info['line']}, column {token_info['col']}. Expected INT, FLOAT, or TEXT."
-                        )
-                    columns[col_name] = col_type
+        for column in node.columns:
+            if column.name and column.data_type:
+                col_name, col_type = column.name.name, column.data_type
+                if col_type not in ['INT', 'FLOAT', 'TEXT']:
+                    token_info = self.get_token_info(column, end=True)
+                    self.errors.append(
+                        f"Semantic Error: Invalid data type '{col_type}' at line {token_info['line']}, column {token_info['col']}. Expected INT, FLOAT, or TEXT."
+                    )
+                columns[col_name] = col_type
     
     def _process_insert(self, node):
-        table_name = None
-        values = []
-
-        for child in node.children:
-            if child.name == "IDENTIFIER":
-                table_name = child.value
-                break
-        
-        if not table_name:
+        if not node.table:
             return
+        table_name = node.table.name
         
         if table_name not in self.symbol_table:
-            token_info = self.get_token_info(table_name)
+            token_info = self.get_token_info(node.table)
             self.errors.append(
                 f"Semantic Error: Table '{table_name}' is not declared at line {token_info['line']}, column {token_info['col']}."
             )
             return
         
-        for child in node.children:
-            if child.name == "ValueList":
-                self._extract_values(child, values)
+        values = self._extract_values(node)
         
         table_columns = list(self.symbol_table[table_name]['columns'].items())
         
         if len(values) != len(table_columns):
-            token_info = self.get_token_info(table_name)
+            token_info = self.get_token_info(node.table)
             self.errors.append(
                 f"Semantic Error: Type mismatch at line {token_info['line']}, column {token_info['col']}. Table '{table_name}' expects {len(table_columns)} values, but {len(values)} were provided."
             )
@@ -122,21 +148,16 @@ class SemanticAnalyzer:
         
         for i, (col_name, col_type) in enumerate(table_columns):
             if i < len(values):
-                value_type, value_literal = values[i]
+                value_type, value_literal = f"{values[i].kind}_LITERAL", values[i].value
                 if not self._check_type_compatibility(col_type, value_type, value_literal):
-                    token_info = self.get_token_info(value_literal)
+                    token_info = self.get_token_info(values[i])
                     self.errors.append(
                         f"Semantic Error: Type mismatch at line {token_info['line']}, column {token_info['col']}. Column '{col_name}' is defined as {col_type}, but a {value_type} literal was provided for insertion."
                     )
     
-    def _extract_values(self, node, values):
-        for child in node.children:
-            if child.name == "Value":
-                parts = child.value.split(':', 1)
-                if len(parts) == 2:
-                    value_type = parts[0]
-                    value_literal = parts[1]
-                    values.append((value_type, value_literal))
+    def _extract_values(self, node):
+        # Empty value slots are skipped.
+        return [value for value in node.values if value]
     
     def _check_type_compatibility(self, col_type, value_type, value_literal):
         if col_type == "INT":
@@ -150,303 +171,279 @@ class SemanticAnalyzer:
         return False
     
     def _process_select(self, node):
-        table_name = None
         columns = []
         
-        for i, child in enumerate(node.children):
-            if child.name == "FROM":
-                if i + 1 < len(node.children) and node.children[i + 1].name == "IDENTIFIER":
-                    table_name = node.children[i + 1].value
-                break
-        
+        table_name = self._from_table(node)
         if not table_name:
             return
-
+        
         if table_name not in self.symbol_table:
-            token_info = self.get_token_info(table_name)
+            token_info = self.get_token_info(node.table)
             self.errors.append(
                 f"Semantic Error: Table '{table_name}' is not declared at line {token_info['line']}, column {token_info['col']}."
             )
             return
         
-        for child in node.children:
-            if child.name == "SelectList":
-                self._extract_select_columns(child, columns)
+        # SELECT * (columns is None) has nothing to check.
+        for expr in node.columns or ():
+            self._extract_from_expression(expr, columns)
         
-        for col_name in columns:
-            if col_name != "*" and col_name not in self.symbol_table[table_name]['columns']:
-                token_info = self.get_token_info(col_name)
+        for column in columns:
+            col_name = column.name
+            if col_name not in self.symbol_table[table_name]['columns']:
+                token_info = self.get_token_info(column)
                 self.errors.append(
                     f"Semantic Error: Column '{col_name}' does not exist in table '{table_name}' at line {token_info['line']}, column {token_info['col']}."
                 )
         
-        for child in node.children:
-            if child.name == "WhereClause":
-                self._process_where(child, table_name)
-    
-    def _extract_select_columns(self, node, columns):
-        for child in node.children:
-            if child.name == "MULTIPLY":
-                columns.append("*")
-            elif child.name == "ExpressionList":
-                self._extract_expression_columns(child, columns)
-    
-    def _extract_expression_columns(self, node, columns):
-        for child in node.children:
-            if child.name == "Expression":
-                self._extract_from_expression(child, columns)
+        if node.where:
+            self._process_condition(node.where, table_name)
     
     def _extract_from_expression(self, node, columns):
-        for child in node.children:
-            if child.name == "Term":
-                self._extract_from_term(child, columns)
-    
-    def _extract_from_term(self, node, columns):
-        for child in node.children:
-            if child.name == "Factor":
-                if child.value and child.value.startswith("IDENTIFIER:"):
-                    col_name = child.value.split(':', 1)[1]
-                    columns.append(col_name)
-            elif child.name in ["Expression", "Term"]:
-                self._extract_from_expression(child, columns)
+        # Only bare column names are checked, not those inside parentheses:
+        # the factors of every term are the nodes reached through BinaryOp
+        # alone, taken left to right.
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            kind = type(node)
+            if kind is BinaryOp:
+                stack.append(node.right)
+                stack.append(node.left)
+            elif kind is Identifier:
+                columns.append(node)
     
     def _process_update(self, node):
-        table_name = None
         assignments = []
         
-        for child in node.children:
-            if child.name == "IDENTIFIER":
-                table_name = child.value
-                break
-        
-        if not table_name:
+        if not node.table:
             return
+        table_name = node.table.name
         
         if table_name not in self.symbol_table:
-            token_info = self.get_token_info(table_name)
+            token_info = self.get_token_info(node.table)
             self.errors.append(
                 f"Semantic Error: Table '{table_name}' is not declared at line {token_info['line']}, column {token_info['col']}."
             )
             return
         
-        for child in node.children:
-            if child.name == "AssignmentList":
-                self._extract_assignments(child, assignments)
+        self._extract_assignments(node, assignments)
         
-        for col_name, value_type, value_literal in assignments:
+        for column, value_type, value_literal, value in assignments:
+            col_name = column.name
             if col_name not in self.symbol_table[table_name]['columns']:
-                token_info = self.get_token_info(col_name)
+                token_info = self.get_token_info(column)
                 self.errors.append(
                     f"Semantic Error: Column '{col_name}' does not exist in table '{table_name}' at line {token_info['line']}, column {token_info['col']}."
                 )
             else:
                 col_type = self.symbol_table[table_name]['columns'][col_name]
                 if value_type and not self._check_type_compatibility(col_type, value_type, value_literal):
-                    token_info = self.get_token_info(value_literal)
+                    token_info = self.get_token_info(value)
                     self.errors.append(
                         f"Semantic Error: Type mismatch at line {token_info['line']}, column {token_info['col']}. Column '{col_name}' is defined as {col_type}, but a {value_type} was provided."
                     )
-                    
-        for child in node.children:
-            if child.name == "WhereClause":
-                self._process_where(child, table_name)
+        
+        if node.where:
+            self._process_condition(node.where, table_name)
     
     def _extract_assignments(self, node, assignments):
-        for child in node.children:
-            if child.name == "Assignment":
-                col_name = None
-                value_type = None
-                value_literal = None
-                
-                for subchild in child.children:
-                    if subchild.name == "IDENTIFIER":
-                        col_name = subchild.value
-                    elif subchild.name == "Expression":
-                        value_info = self._extract_value_from_expression(subchild)
-                        if value_info:
-                            value_type, value_literal = value_info
-                
-                if col_name:
-                    assignments.append((col_name, value_type, value_literal))
+        for assignment in node.assignments:
+            value_type = None
+            value_literal = None
+            value = None
+            
+            if value_info := self._first_operand(assignment.value):
+                kind, value_literal, value = value_info
+                value_type = kind + '_LITERAL'
+            
+            if assignment.column:
+                assignments.append((assignment.column, value_type, value_literal, value))
     
-    def _extract_value_from_expression(self, node):
-        for child in node.children:
-            if child.name == "Term":
-                return self._extract_value_from_term(child)
-        return None
-    
-    def _extract_value_from_term(self, node):
-        for child in node.children:
-            if child.name == "Factor":
-                if child.value and ':' in child.value:
-                    parts = child.value.split(':', 1)
-                    return (parts[0] + '_LITERAL', parts[1])
+    def _first_operand(self, node):
+        # (kind, lexeme, node) of the first identifier or literal among the
+        # factors of the expression's first term.
+        while type(node) is BinaryOp and node.op in ADDITIVE_OPS:
+            node = node.left
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            kind = type(node)
+            if kind is Identifier:
+                return ('IDENTIFIER', node.name, node)
+            if kind is Literal:
+                return (node.kind, node.value, node)
+            if kind is BinaryOp:
+                stack.append(node.right)
+                stack.append(node.left)
         return None
     
     def _process_delete(self, node):
-        table_name = None
-        
-        for i, child in enumerate(node.children):
-            if child.name == "FROM":
-                if i + 1 < len(node.children) and node.children[i + 1].name == "IDENTIFIER":
-                    table_name = node.children[i + 1].value
-                break
-        
+        table_name = self._from_table(node)
         if not table_name:
             return
         
         if table_name not in self.symbol_table:
-            token_info = self.get_token_info(table_name)
+            token_info = self.get_token_info(node.table)
             self.errors.append(
                 f"Semantic Error: Table '{table_name}' is not declared at line {token_info['line']}, column {token_info['col']}."
             )
             return
         
-        for child in node.children:
-            if child.name == "WhereClause":
-                self._process_where(child, table_name)
-    
-    def _process_where(self, node, table_name):
-        for child in node.children:
-            if child.name == "Condition":
-                self._process_condition(child, table_name)
+        if node.where:
+            self._process_condition(node.where, table_name)
     
     def _process_condition(self, node, table_name):
-        for child in node.children:
-            if child.name in ["AndCondition", "Condition"]:
-                self._process_condition(child, table_name)
-            elif child.name == "NotCondition":
-                self._process_not_condition(child, table_name)
+        # The conditions joined by OR and AND, left to right, each handed to
+        # the handler for its node type.
+        conditions = self.CONDITIONS
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            kind = type(node)
+            if kind is LogicalOp:
+                stack.append(node.right)
+                stack.append(node.left)
+            elif kind in conditions:
+                conditions[kind](self, node, table_name)
     
     def _process_not_condition(self, node, table_name):
-        for child in node.children:
-            if child.name == "Comparison":
-                self._process_comparison(child, table_name)
-            elif child.name == "BooleanExpr":
-                if child.value and child.value.startswith("IDENTIFIER:"):
-                    col_name = child.value.split(':', 1)[1]
-                    if col_name not in self.symbol_table[table_name]['columns']:
-                        token_info = self.get_token_info(col_name)
-                        self.errors.append(
-                            f"Semantic Error: Column '{col_name}' does not exist in table '{table_name}' at line {token_info['line']}, column {token_info['col']}."
-                        )
+        if handler := self.CONDITIONS.get(type(node.operand)):
+            handler(self, node.operand, table_name)
+    
+    def _process_column_condition(self, node, table_name):
+        # A bare boolean column.
+        col_name = node.name
+        if col_name not in self.symbol_table[table_name]['columns']:
+            token_info = self.get_token_info(node)
+            self.errors.append(
+                f"Semantic Error: Column '{col_name}' does not exist in table '{table_name}' at line {token_info['line']}, column {token_info['col']}."
+            )
     
     def _process_comparison(self, node, table_name):
-        left_col = None
-        left_type = None
-        right_type = None
-        right_literal = None
-        
-        expressions = []
-        for child in node.children:
-            if child.name == "Expression":
-                expressions.append(child)
-        
-        if len(expressions) >= 2:
-            left_info = self._extract_comparison_operand(expressions[0])
-            if left_info:
-                left_col, left_type, left_literal = left_info
+        left_info = self._first_operand(node.left)
+        if left_info:
+            left_type, left_col, left = left_info
+            
+            if left_type == "IDENTIFIER" and left_col:
+                if left_col not in self.symbol_table[table_name]['columns']:
+                    token_info = self.get_token_info(left)
+                    self.errors.append(
+                        f"Semantic Error: Column '{left_col}' does not exist in table '{table_name}' at line {token_info['line']}, column {token_info['col']}."
+                    )
+                    return
+                col_type = self.symbol_table[table_name]['columns'][left_col]
                 
-                if left_type == "IDENTIFIER" and left_col:
-                    if left_col not in self.symbol_table[table_name]['columns']:
-                        token_info = self.get_token_info(left_col)
-                        self.errors.append(
-                            f"Semantic Error: Column '{left_col}' does not exist in table '{table_name}' at line {token_info['line']}, column {token_info['col']}."
-                        )
-                        return
-                    col_type = self.symbol_table[table_name]['columns'][left_col]
+                right_info = self._first_operand(node.right)
+                if right_info:
+                    right_type, _, right = right_info
                     
-                    right_info = self._extract_comparison_operand(expressions[1])
-                    if right_info:
-                        _, right_type, right_literal = right_info
-                        
-                        if right_type == "NUMBER":
-                            if col_type == "TEXT":
-                                token_info = self.get_token_info(right_literal)
-                                self.errors.append(
-                                    f"Semantic Error: Type mismatch at line {token_info['line']}, column {token_info['col']}. Column '{left_col}' is defined as {col_type}, but a NUMBER literal was used in comparison."
-                                )
-                        elif right_type == "STRING":
-                            if col_type in ["INT", "FLOAT"]:
-                                token_info = self.get_token_info(right_literal)
-                                self.errors.append(
-                                    f"Semantic Error: Type mismatch at line {token_info['line']}, column {token_info['col']}. Column '{left_col}' is defined as {col_type}, but a STRING literal was used in comparison."
-                                )
-    
-    def _extract_comparison_operand(self, node):
-        for child in node.children:
-            if child.name == "Term":
-                return self._extract_from_term_comparison(child)
-        return None
+                    if right_type == "NUMBER":
+                        if col_type == "TEXT":
+                            token_info = self.get_token_info(right)
+                            self.errors.append(
+                                f"Semantic Error: Type mismatch at line {token_info['line']}, column {token_info['col']}. Column '{left_col}' is defined as {col_type}, but a NUMBER literal was used in comparison."
+                            )
+                    elif right_type == "STRING":
+                        if col_type in ["INT", "FLOAT"]:
+                            token_info = self.get_token_info(right)
+                            self.errors.append(
+                                f"Semantic Error: Type mismatch at line {token_info['line']}, column {token_info['col']}. Column '{left_col}' is defined as {col_type}, but a STRING literal was used in comparison."
+                            )
     
-    def _extract_from_term_comparison(self, node):
-        for child in node.children:
-            if child.name == "Factor":
-                if child.value and ':' in child.value:
-                    parts = child.value.split(':', 1)
-                    return (parts[1], parts[0], parts[1])
-        return None
+    # Condition node type -> handler, for the operands of AND, OR and NOT.
+    CONDITIONS = {
+        Comparison: _process_comparison,
+        Identifier: _process_column_condition,
+        Not: _process_not_condition,
+    }
+    
+    # Statement type -> (how it names the table it checks against, handler).
+    CHECKS = {
+        InsertStmt: (_named_table, _process_insert),
+        SelectStmt: (_from_table, _process_select),
+        UpdateStmt: (_named_table, _process_update),
+        DeleteStmt: (_from_table, _process_delete),
+    }
+    
+    def _resolve_columns(self, stmt, table_name):
+        # Stores on every column reference in the statement's expressions its
+        # type in the statement's own table, so that annotation only has to
+        # read it. Without a table name (no FROM) a column takes the type from
+        # the first table declaring it.
+        kind = type(stmt)
+        if kind is SelectStmt:
+            stack = [stmt.where, *(stmt.columns or ())]
+        elif kind is UpdateStmt:
+            stack = [stmt.where, *(assignment.value for assignment in stmt.assignments)]
+        elif kind is DeleteStmt:
+            stack = [stmt.where]
+        else:
+            return
+        
+        columns, index = None, self.column_index
+        if table_name:
+            table = self.symbol_table.get(table_name)
+            columns = table['columns'] if table else {}
+        while stack:
+            node = stack.pop()
+            kind = type(node)
+            if kind is Identifier:
+                node.data_type = columns.get(node.name) if columns is not None else index.get(node.name, (None, None))[1]
+            elif kind is BinaryOp or kind is Comparison or kind is LogicalOp:
+                stack.append(node.right)
+                stack.append(node.left)
+            elif kind is Paren:
+                stack.append(node.expr)
+            elif kind is Not:
+                stack.append(node.operand)
     
-    def get_symbol_table_dump(self):
+    def iter_symbol_table_dump(self, max_tables=None):
         if not self.symbol_table:
-            return "Symbol Table is empty.\n"
+            yield "Symbol Table is empty.\n"
+            return
         
-        output = "\n=== Symbol Table ===\n"
-        for table_name, table_info in self.symbol_table.items():
-            output += f"\nTable: {table_name}\n"
-            output += "  Columns:\n"
+        yield "\n=== Symbol Table ===\n"
+        for shown, (table_name, table_info) in enumerate(self.symbol_table.items()):
+            if shown == max_tables:
+                yield f"\n... ({len(self.symbol_table) - shown} more tables)\n"
+                return
+            yield f"\nTable: {table_name}\n"
+            yield "  Columns:\n"
             for col_name, col_type in table_info['columns'].items():
-                output += f"    {col_name}: {col_type}\n"
-        return output
+                yield f"    {col_name}: {col_type}\n"
     
-    def get_annotated_tree(self):
+    def write_symbol_table_dump(self, stream, max_tables=None):
+        stream.writelines(self.iter_symbol_table_dump(max_tables))
+    
+    def get_symbol_table_dump(self, max_tables=None):
+        return "".join(self.iter_symbol_table_dump(max_tables))
+    
+    def iter_annotated_tree(self, max_depth=None, max_nodes=None):
         if not self.parse_tree:
-            return ""
+            return
         
-        output = "\n=== Annotated Parse Tree ===\n"
-        output += self._annotate_node(self.parse_tree, "")
-        return output
+        yield "\n=== Annotated Parse Tree ===\n"
+        yield from tree_lines(to_parse_tree(self.parse_tree), self._annotate_node, indent="    ",
+                              max_depth=max_depth, max_nodes=max_nodes)
     
-    def _annotate_node(self, node, prefix, is_last=True):
-        if node is None:
-            return ""
-        
-        output = ""
-        connector = "└── " if is_last else "├── "
-        
-        node_str = str(node)
+    def write_annotated_tree(self, stream, max_depth=None, max_nodes=None):
+        stream.writelines(self.iter_annotated_tree(max_depth, max_nodes))
+    
+    def get_annotated_tree(self, max_depth=None, max_nodes=None):
+        return "".join(self.iter_annotated_tree(max_depth, max_nodes))
+    
+    def _annotate_node(self, node):
         type_info = self._get_type_annotation(node)
-        if type_info:
-            node_str += f" [{type_info}]"
-        
-        if prefix:
-            output += prefix + connector + node_str + "\n"
-        else:
-            output += node_str + "\n"
-        
-        for i, child in enumerate(node.children):
-            is_last_child = (i == len(node.children) - 1)
-            new_prefix = prefix + ("    " if is_last else "│   ")
-            output += self._annotate_node(child, new_prefix, is_last_child)
-        
-        return output
+        return f"{node} [{type_info}]" if type_info else str(node)
     
     def _get_type_annotation(self, node):
-        if node.name == "Factor" and node.value:
-            if node.value.startswith("IDENTIFIER:"):
-                col_name = node.value.split(':', 1)[1]
-                for table_name, table_info in self.symbol_table.items():
-                    if col_name in table_info['columns']:
-                        return f"Type: {table_info['columns'][col_name]}"
-            elif node.value.startswith("NUMBER:"):
-                return "Type: NUMBER"
-            elif node.value.startswith("STRING:"):
-                return "Type: STRING"
-        elif node.name == "Value" and node.value:
-            if node.value.startswith("NUMBER_LITERAL:"):
-                return "Type: NUMBER"
-            elif node.value.startswith("STRING_LITERAL:"):
-                return "Type: STRING"
+        source = node.source
+        if node.name == "Factor" and isinstance(source, Identifier):
+            if source.data_type:
+                return f"Type: {source.data_type}"
+        elif node.name in ("Factor", "Value") and isinstance(source, Literal):
+            return f"Type: {source.kind}"
         elif node.name == "DataType" and node.value:
             return f"Type: {node.value}"
         return None
@@ -0,0 +1,36 @@
+import copy
+from api import Compiler, compile_sql
+from catalog import Catalog
+
+FIRST = "CREATE TABLE t (a INT);\nSELECT a FROM t WHERE a = 'x';\n@"
+SECOND = "SELECT a FROM t;"
+
+def snapshot(result):
+    return copy.deepcopy((list(result.tokens), result.lexer_errors, result.symbols, result.parser_errors,
+                          result.semantic_errors, result.symbol_table))
+
+def test_calls_on_one_thread_are_independent():
+    first = compile_sql(FIRST)
+    before = snapshot(first)
+    second = compile_sql(SECOND)
+    # Nothing of the first script is left in the second result, nor was the
+    # first result changed by the second call.
+    assert snapshot(first) == before
+    assert snapshot(second) == snapshot(Compiler().compile(SECOND))
+    assert second.symbol_table == {}
+    assert second.semantic_errors == ["Semantic Error: Table 't' is not declared at line 1, column 15."]
+    assert first.ast is not second.ast
+    assert len(first.errors) == 2
+
+def test_catalog_tables_do_not_leak_into_later_calls():
+    catalog, _ = Catalog.compile("CREATE TABLE t (a INT);")
+    assert compile_sql(SECOND, catalog=catalog).success
+    assert compile_sql("CREATE TABLE u (b INT);", catalog=catalog).symbol_table.keys() == {'t', 'u'}
+    assert catalog.tables.keys() == {'t'}
+    assert not compile_sql(SECOND).success
+
+def test_phases_after_a_full_compile():
+    compile_sql(FIRST)
+    result = compile_sql(SECOND, phases='lexer')
+    assert (result.ast, result.parser_errors, result.semantic_errors) == (None, None, None)
+    assert result.success
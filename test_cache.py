@@ -0,0 +1,54 @@
+from cache import LRUCache, content_key
+
+def test_evicts_least_recently_used_by_size():
+    cache = LRUCache(10)
+    cache.put('a', 1, 4)
+    cache.put('b', 2, 4)
+    assert cache.get('a') == 1
+    cache.put('c', 3, 4)
+    assert cache.get('b') is None
+    assert (cache.get('a'), cache.get('c')) == (1, 3)
+    cache.put('d', 4, 8)
+    assert list(cache.entries) == ['d']
+    assert cache.stats()['size'] == 8
+    assert cache.stats()['evictions'] == 3
+
+def test_replacing_an_entry_counts_its_new_size():
+    cache = LRUCache(10)
+    cache.put('a', 1, 4)
+    cache.put('a', 2, 6)
+    cache.put('b', 3, 4)
+    assert (cache.get('a'), cache.get('b')) == (2, 3)
+    assert cache.stats()['size'] == 10
+
+def test_refuses_entries_larger_than_the_budget():
+    cache = LRUCache(10)
+    cache.put('a', 1, 4)
+    cache.put('big', 2, 11)
+    assert cache.get('big') is None
+    assert cache.get('a') == 1
+    # Replacing an entry with one too large drops it.
+    cache.put('a', 3, 11)
+    assert cache.get('a') is None
+    assert cache.stats()['size'] == 0
+    assert cache.stats()['evictions'] == 0
+
+def test_counts_hits_and_misses():
+    cache = LRUCache(10)
+    assert cache.stats()['hit_rate'] == 0.0
+    cache.put('a', 0, 1)
+    assert cache.get('a') == 0
+    assert cache.get('b') is None
+    cache.get('a')
+    cache.get('c')
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['hit_rate']) == (2, 2, 0.5)
+    cache.clear()
+    assert cache.stats()['entries'] == cache.stats()['size'] == 0
+    assert cache.stats()['hits'] == 2
+
+def test_content_key_depends_on_text_and_options():
+    assert content_key("SELECT a;", 1) == content_key("SELECT a;", 1)
+    assert content_key("SELECT a;", 1) != content_key("SELECT a;", 2)
+    assert content_key("SELECT a;", 1) != content_key("SELECT b;", 1)
+    assert content_key("\ud800") != content_key("\udc00")
@@ -0,0 +1,63 @@
+import copy
+import pickle
+import pytest
+from catalog import HEADER, MAGIC, VERSION, Catalog
+from incremental import IncrementalCompiler
+from lexer import Lexer
+from parser import Parser
+from semantic import SemanticAnalyzer
+
+SCHEMA = "CREATE TABLE t (a INT, b TEXT);\nCREATE TABLE u (a FLOAT, c INT);"
+
+@pytest.fixture
+def catalog():
+    catalog, errors = Catalog.compile(SCHEMA)
+    assert errors == []
+    return catalog
+
+def test_save_and_load_round_trip(catalog, tmp_path):
+    path = tmp_path / 'schema.catalog'
+    catalog.save(path)
+    loaded = Catalog.load(path)
+    assert loaded.tables == catalog.tables == {'t': {'columns': {'a': 'INT', 'b': 'TEXT'}},
+                                               'u': {'columns': {'a': 'FLOAT', 'c': 'INT'}}}
+    assert loaded.column_index == catalog.column_index == {'a': ('t', 'INT'), 'b': ('t', 'TEXT'), 'c': ('u', 'INT')}
+
+@pytest.mark.parametrize('content', [b'', b'SQLCAT', b'NOTACAT\0\1\0' + pickle.dumps(({}, {}))])
+def test_load_rejects_other_files(tmp_path, content):
+    path = tmp_path / 'schema.catalog'
+    path.write_bytes(content)
+    with pytest.raises(ValueError, match="not a catalog file"):
+        Catalog.load(path)
+
+def test_load_rejects_other_versions(tmp_path):
+    path = tmp_path / 'schema.catalog'
+    path.write_bytes(HEADER.pack(MAGIC, VERSION + 1) + pickle.dumps(({}, {})))
+    with pytest.raises(ValueError, match=f"version {VERSION + 1}"):
+        Catalog.load(path)
+
+def test_documents_declaring_tables_leave_the_catalog_unchanged(catalog):
+    tables, column_index = copy.deepcopy(catalog.tables), copy.deepcopy(catalog.column_index)
+    code = "CREATE TABLE v (d INT, a TEXT);\nSELECT d FROM v WHERE a = 'x';\nSELECT c FROM u;"
+    
+    analyzer = SemanticAnalyzer(Parser(Lexer(code, mode='table').tokenize()).parse_ast(), catalog)
+    assert analyzer.analyze() == []
+    assert 'v' in analyzer.symbol_table
+    
+    compiler = IncrementalCompiler(code, catalog)
+    assert compiler.semantic_errors == []
+    compiler.apply_edit(0, 0, "CREATE TABLE w (e INT);\n")
+    assert compiler.semantic_errors == []
+    assert 'w' in compiler.symbol_table
+    
+    extended, errors = Catalog.compile(code, catalog)
+    assert errors == []
+    assert 'v' in extended.tables
+    
+    assert catalog.tables == tables
+    assert catalog.column_index == column_index
+
+def test_documents_without_tables_share_the_catalog(catalog):
+    compiler = IncrementalCompiler("SELECT a FROM t;", catalog)
+    assert compiler.semantic_errors == []
+    assert compiler.symbol_table is catalog.tables
@@ -0,0 +1,224 @@
+import gzip
+import io
+import json
+import os
+from collections import OrderedDict
+import pytest
+import compiler
+from compiler import (GZIP_MIN_BYTES, RESULT_FIELDS, AnalysisPool, CompilerHandler, StaticAsset, encode_body, encode_json,
+                      select_fields)
+from lexer import Lexer
+from parser import Parser, to_parse_tree
+
+@pytest.fixture
+def worker_pool(monkeypatch):
+    # Results cross a process boundary only with real workers.
+    pool = AnalysisPool(workers=2)
+    monkeypatch.setattr(compiler, 'pool', pool)
+    yield pool
+    pool.shutdown()
+
+def analyze_batch(data):
+    return CompilerHandler.analyze_batch(None, data)
+
+def test_batch_full_details_of_deeply_nested_script(worker_pool, nested_script, tree_depth):
+    depth = 3000
+    code = nested_script(depth, 'c')
+    status, result = analyze_batch({'files': [{'name': 'deep.sql', 'code': code}], 'details': 'full'})
+    assert status == 200
+    entry = result['files'][0]
+    assert entry['name'] == 'deep.sql'
+    assert tree_depth(entry['result']['parser']['tree']) > depth
+
+def test_batch_full_details_match_analyze():
+    code = "CREATE TABLE t (a INT);\nSELECT b FROM t WHERE (a + 1) = 2;"
+    status, result = analyze_batch({'files': [{'code': code}], 'details': 'full'})
+    assert status == 200
+    assert result['files'][0]['result'] == CompilerHandler.analyze_code(code)
+
+@pytest.mark.parametrize('data', [
+    {},
+    {'files': 'x'},
+    {'files': ['x']},
+    {'files': [{'name': 1, 'code': 'SELECT a FROM t;'}]},
+    {'files': [{'code': None}]},
+    {'files': [], 'details': 'everything'},
+    {'files': [], 'schema': 5},
+])
+def test_batch_rejects_malformed_requests(data):
+    status, result = analyze_batch(data)
+    assert status == 400
+    assert 'error' in result
+
+class Handler(CompilerHandler):
+    # Records the responses sent with send_body instead of writing them to a
+    # connection; others (streams) are written to wfile.
+    def __init__(self, headers=None, body=b''):
+        self.headers, self.responses = headers or {}, []
+        self.rfile, self.wfile = io.BytesIO(body), io.BytesIO()
+        self.request_version, self.requestline, self.client_address = 'HTTP/1.1', '', ('test', 0)
+    
+    def send_body(self, status, content_type, body, headers=()):
+        self.responses.append((status, dict(headers), body))
+    
+    def log_message(self, format, *args):
+        pass
+
+def post(path, data):
+    body = json.dumps(data).encode()
+    handler = Handler({'Content-Length': str(len(body))}, body)
+    handler.path = path
+    handler.do_POST()
+    return handler
+
+@pytest.fixture
+def documents(monkeypatch):
+    monkeypatch.setattr(compiler, 'documents', OrderedDict())
+
+def post_document(data):
+    handler = Handler()
+    handler.send_document_analysis(data, RESULT_FIELDS, 'nested', False)
+    status, _, body = handler.responses[0]
+    return status, json.loads(body)
+
+@pytest.mark.parametrize('document', [['d'], {'d': 1}, 5])
+def test_document_rejects_ids_other_than_strings(documents, document):
+    status, result = post_document({'document': document, 'code': "SELECT a FROM t;"})
+    assert status == 400
+    assert 'error' in result
+    assert not compiler.documents
+
+@pytest.mark.parametrize('data', [
+    {'code': 5},
+    {'edit': 'x'},
+    {'edit': {'start': 0}},
+    {'edit': {'start': 'x', 'end': 1}},
+    {'edit': {'start': 0, 'end': 1, 'text': 5}},
+    {'edit': {'start': 5, 'end': 2}},
+    {'edit': {'start': 0, 'end': 50}},
+    {'edit': {'start': -1, 'end': 0}},
+])
+def test_document_rejects_malformed_requests(documents, data):
+    code = "CREATE TABLE t (a INT);"
+    assert post_document({'document': 'd', 'code': code})[0] == 200
+    status, result = post_document({'document': 'd', **data})
+    assert status == 400
+    assert 'error' in result
+    # The document still holds its code.
+    status, result = post_document({'document': 'd', 'edit': {'start': len(code), 'end': len(code),
+                                                               'text': "\nSELECT b FROM t;"}})
+    assert status == 200
+    assert result == json.loads(json.dumps(CompilerHandler.analyze_code(code + "\nSELECT b FROM t;")))
+
+def test_pool_recovers_from_a_dead_worker(worker_pool):
+    # A worker exiting mid-analysis, as when killed for memory, fails that
+    # request with 500; the next ones run on new workers.
+    handler = Handler()
+    handler.send_analysis('dies', os._exit, 1)
+    status, _, body = handler.responses[0]
+    assert status == 500
+    assert 'error' in json.loads(body)
+    assert worker_pool.run(len, 'abc') == 3
+    status, result = analyze_batch({'files': [{'code': 'SELECT a FROM t;'}]})
+    assert status == 200
+    assert result['summary']['failed'] == 1
+
+def test_flat_tree_round_trip_of_deeply_nested_script(nested_script):
+    depth = 5000
+    code = nested_script(depth)
+    tree = to_parse_tree(Parser(Lexer(code, mode='table').tokenize()).parse_ast())
+    nested = CompilerHandler.tree_to_dict(tree)
+    table = CompilerHandler.tree_to_table(tree)
+    assert len(table['names']) == len(table['parents']) > 2 * depth
+    # Nested dicts this deep only compare through the iterative encoder.
+    assert encode_json(CompilerHandler.table_to_dict(table)) == encode_json(nested)
+
+def test_fields_select_the_result_keys():
+    code = "CREATE TABLE t (a INT);\nSELECT b FROM t;"
+    fields = select_fields(['summary', 'lexer.errors', 'semantic.errors', 'parser'])
+    result = CompilerHandler.analyze_code(code, fields=fields)
+    assert {phase: set(values) for phase, values in result.items() if phase != 'summary'} == {
+        'lexer': {'errors'}, 'parser': {'errors', 'tree'}, 'semantic': {'errors'}}
+    full = CompilerHandler.analyze_code(code)
+    assert result['summary'] == full['summary']
+    assert result['semantic']['errors'] == full['semantic']['errors']
+    assert list(CompilerHandler.analyze_code(code, fields=select_fields(['lexer.tokens']))) == ['lexer']
+
+@pytest.mark.parametrize('names', ['summary', ['nope'], ['lexer.nope'], [1]])
+def test_fields_rejects_unknown_names(names):
+    with pytest.raises(ValueError):
+        select_fields(names)
+
+def test_only_large_responses_are_gzipped():
+    small = {'error': 'x' * (GZIP_MIN_BYTES // 2)}
+    assert encode_body(small, compress=True) == (json.dumps(small).encode(), None)
+    large = {'error': 'x' * GZIP_MIN_BYTES}
+    body, encoding = encode_body(large, compress=True)
+    assert encoding == 'gzip'
+    assert json.loads(gzip.decompress(body)) == large
+    assert encode_body(large) == (json.dumps(large).encode(), None)
+
+def read_stream(handler):
+    # The NDJSON lines of a chunked response.
+    head, _, body = handler.wfile.getvalue().partition(b'\r\n\r\n')
+    assert head.startswith(b'HTTP/1.1 200')
+    data = b''
+    while True:
+        size, _, body = body.partition(b'\r\n')
+        size = int(size, 16)
+        if not size:
+            break
+        data, body = data + body[:size], body[size + 2:]
+    return [json.loads(line) for line in data.decode().splitlines()]
+
+def test_stream_matches_analyze():
+    statements = ["SELECT z FROM u;", "CREATE TABLE t (a INT, b TEXT);", "SELECT b + 1;",
+                  "CREATE TABLE u (a INT, c BLOB);", "SELECT c FROM t WHERE a = 'x';", "CREATE TABLE t (x INT);",
+                  "INSERT INTO u VALUES (1);", "SELECT a FROM v;", "@ SELECT a FROM t;"]
+    code = "\n".join(statements)
+    lines = read_stream(post('/analyze_stream', {'code': code}))
+    full = json.loads(json.dumps(CompilerHandler.analyze_code(code)))
+    *pieces, closing = lines
+    assert closing['summary'] == full['summary']
+    assert closing['symbols'] == full['lexer']['symbols']
+    assert closing['symbol_table'] == full['semantic']['symbol_table']
+    pieces, deferred = [line for line in pieces if 'deferred' not in line], [line for line in pieces if 'deferred' in line]
+    assert [line['statement'] for line in pieces] == list(range(len(statements)))
+    assert [token for line in pieces for token in line['tokens']] == full['lexer']['tokens']
+    assert [tree for line in pieces for tree in line['tree']] == full['parser']['tree']['children']
+    for phase in ('lexer', 'parser'):
+        assert [error for line in pieces for error in line['errors'][phase]] == full[phase]['errors']
+    # /analyze's order: CREATE TABLE errors, then the others by statement,
+    # the deferred ones included.
+    creates = [i for i, statement in enumerate(statements) if statement.startswith('CREATE')]
+    checks = sorted((line for line in pieces + deferred if line['statement'] not in creates),
+                    key=lambda line: line['statement'])
+    assert ([error for i in creates for error in pieces[i]['errors']['semantic']]
+            + [error for line in checks for error in line['errors']['semantic']]) == full['semantic']['errors']
+    assert [line['statement'] for line in deferred] == [0, 7]
+
+ASSET = StaticAsset('text/html', 'x' * GZIP_MIN_BYTES)
+
+def get_asset(headers):
+    # (status, ETag, body) of a GET for ASSET.
+    handler = Handler(headers)
+    handler.send_asset(ASSET)
+    if handler.responses:
+        status, headers, body = handler.responses[0]
+        return status, headers['ETag'], body
+    head = handler.wfile.getvalue().decode()
+    return int(head.split()[1]), head.split('ETag: ')[1].split('\r\n')[0], None
+
+@pytest.mark.parametrize('headers, expected', [
+    ({}, (200, ASSET.etag, ASSET.body)),
+    ({'Accept-Encoding': 'gzip'}, (200, ASSET.gzip_etag, ASSET.gzipped)),
+    ({'If-None-Match': ASSET.etag}, (304, ASSET.etag, None)),
+    ({'If-None-Match': f'W/{ASSET.gzip_etag}', 'Accept-Encoding': 'gzip'}, (304, ASSET.gzip_etag, None)),
+    # A tag for the other encoding must not keep the client on it.
+    ({'If-None-Match': ASSET.gzip_etag}, (200, ASSET.etag, ASSET.body)),
+    ({'If-None-Match': ASSET.etag, 'Accept-Encoding': 'gzip'}, (200, ASSET.gzip_etag, ASSET.gzipped)),
+    ({'If-None-Match': f'"other", {ASSET.etag}'}, (304, ASSET.etag, None)),
+    ({'If-None-Match': '*'}, (304, ASSET.etag, None)),
+])
+def test_asset_revalidation_matches_the_selected_encoding(headers, expected):
+    assert get_asset(headers) == expected
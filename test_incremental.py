@@ -0,0 +1,70 @@
+from cache import LRUCache
+from incremental import IncrementalCompiler
+from lexer import Lexer
+from parallel import ParallelFrontEnd
+from parser import Parser
+from semantic import SemanticAnalyzer
+
+def analyze(code):
+    analyzer = SemanticAnalyzer(Parser(Lexer(code, mode='table').tokenize()).parse_ast())
+    return analyzer.analyze(), analyzer.get_annotated_tree()
+
+def test_documents_sharing_segments_keep_their_own_results():
+    # The SELECT is one shared segment, checked against a different table t
+    # by each document.
+    query = "\nSELECT a FROM t WHERE a = 'x';"
+    first, second = "CREATE TABLE t (a INT);" + query, "CREATE TABLE t (a TEXT);" + query
+    segments = LRUCache(1 << 20)
+    one = IncrementalCompiler(first, None, segments)
+    two = IncrementalCompiler(second, None, segments)
+    assert one.segments[1] is two.segments[1]
+    for compiler, code in ((one, first), (two, second), (one, first)):
+        errors, annotated_tree = analyze(code)
+        assert compiler.semantic_errors == errors
+        assert compiler.annotator().get_annotated_tree() == annotated_tree
+
+def run(code):
+    lexer = Lexer(code, mode='table')
+    parser = Parser(lexer.tokenize())
+    return lexer.errors, parser.errors, SemanticAnalyzer(parser.parse_ast()).analyze()
+
+def test_errors_quoting_positions_in_later_segments():
+    # The lexemes quoted in these messages look like error positions.
+    code = ("CREATE TABLE t (a INT, b TEXT);\n"
+            "SELECT a FROM t;\n"
+            "SELECT a FROM t WHERE b 'line 9, column 9' @;\n"
+            "  INSERT INTO t VALUES (1, 'x') 'line 1, column 2';\n"
+            "SELECT a FROM t WHERE a = 'at line 3, column 4';\n"
+            "'line 1, column 3';\n")
+    compiler = IncrementalCompiler(code)
+    assert (compiler.lexer_errors, compiler.parser_errors, compiler.semantic_errors) == run(code)
+    for start, text in ((0, "\n\n"), (33, "  "), (0, "SELECT b FROM t;")):
+        code = code[:start] + text + code[start:]
+        compiler.apply_edit(start, start, text)
+        assert (compiler.lexer_errors, compiler.parser_errors, compiler.semantic_errors) == run(code)
+
+def test_forward_reference_errors_keep_their_statement_place():
+    # The SELECT on line 1 waits for u, declared on line 5, and the one on
+    # line 3 (no table) for every declaration; their errors still come in
+    # statement order after the CREATE TABLE ones.
+    code = ("SELECT z FROM u WHERE a = 'x';\n"
+            "CREATE TABLE t (a INT, b TEXT);\n"
+            "SELECT c, a;\n"
+            "DELETE FROM t WHERE b = 1;\n"
+            "CREATE TABLE u (a INT, c TEXT);\n"
+            "CREATE TABLE t (d INT);\n"
+            "UPDATE u SET c = 1 WHERE q = 2;")
+    errors = [
+        "Semantic Error: Table 't' is already declared at line 6, column 14.",
+        "Semantic Error: Column 'z' does not exist in table 'u' at line 1, column 8.",
+        "Semantic Error: Type mismatch at line 1, column 27. Column 'a' is defined as INT, but a STRING literal was used in comparison.",
+        "Semantic Error: Type mismatch at line 4, column 25. Column 'b' is defined as TEXT, but a NUMBER literal was used in comparison.",
+        "Semantic Error: Type mismatch at line 7, column 18. Column 'c' is defined as TEXT, but a NUMBER_LITERAL was provided.",
+        "Semantic Error: Column 'q' does not exist in table 'u' at line 7, column 26.",
+    ]
+    assert analyze(code)[0] == errors
+    assert IncrementalCompiler(code).semantic_errors == errors
+    front_end = ParallelFrontEnd(code, workers=1, chunk_size=1).run()
+    assert front_end.analyze() == errors
+    # The columns of the tableless SELECT resolve against u, declared after it.
+    assert [column.data_type for column in front_end.statements[2].columns] == ['TEXT', 'INT']
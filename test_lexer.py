@@ -0,0 +1,37 @@
+import io
+import pytest
+from lexer import Lexer, StreamLexer
+
+def lex(lexer):
+    return list(lexer.tokenize()), lexer.errors, lexer.symbols
+
+def test_sql_files_are_found(sql_files):
+    assert sql_files
+
+def test_table_mode_matches_char_mode(sql_path, read_sql):
+    code = read_sql(sql_path)
+    assert lex(Lexer(code, mode='table')) == lex(Lexer(code, mode='char'))
+
+def test_compact_tokens_match_char_mode(sql_path, read_sql):
+    code = read_sql(sql_path)
+    assert lex(Lexer(code, mode='table', compact=True)) == lex(Lexer(code, mode='char'))
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 1 << 20])
+def test_stream_lexer_matches_char_mode(sql_path, chunk_size, read_sql):
+    code = read_sql(sql_path)
+    assert lex(StreamLexer(io.BytesIO(code.encode()), chunk_size)) == lex(Lexer(code, mode='char'))
+
+@pytest.mark.parametrize('mode', ['char', 'table'])
+def test_lexing_from_an_offset_matches_the_whole_file(sql_path, mode, read_sql):
+    # Lexing the text after the first statement from its position gives the
+    # tokens and errors of a run over the whole file from there on.
+    code = read_sql(sql_path)
+    cut = code.index(';') + 1
+    prefix = Lexer(code[:cut], mode=mode)
+    prefix.tokenize()
+    line, col = code.count('\n', 0, cut) + 1, cut - code.rfind('\n', 0, cut)
+    whole = Lexer(code, mode=mode)
+    tokens = whole.tokenize()
+    rest = Lexer(code[cut:], mode=mode, line=line, col=col)
+    assert list(rest.tokenize()) == tokens[len(prefix.tokens):]
+    assert rest.errors == whole.errors[len(prefix.errors):]
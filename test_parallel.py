@@ -0,0 +1,51 @@
+import pytest
+from ast_nodes import flatten
+from lexer import Lexer
+from parser import Parser
+from parallel import ParallelFrontEnd
+from semantic import SemanticAnalyzer
+
+# Well past the nesting at which pickling a tree runs out of recursion.
+DEPTH = 5000
+
+# Statements after the nested one, so that the script spans several chunks.
+TAIL = "SELECT b FROM t WHERE b = 'x';\nSELECT c FROM t WHERE a = 'x';\n" * 10
+
+def test_run_returns_deeply_nested_statements_from_workers(nested_script):
+    code = nested_script(DEPTH, tail=TAIL)
+    front_end = ParallelFrontEnd(code, workers=2, chunk_size=64).run()
+    parser = Parser(Lexer(code, mode='table').tokenize())
+    ast = parser.parse_ast()
+    assert len(front_end.chunk_statements) > 1
+    assert front_end.parser_errors == parser.errors
+    assert flatten(front_end.statements) == flatten(ast.statements)
+
+# Statements parsed in workers arrive pickled, those of a serial run() as
+# trees; analyze() ships both to its own workers.
+@pytest.mark.parametrize('run_workers', [2, 1])
+def test_analyze_checks_deeply_nested_statements_in_workers(nested_script, run_workers):
+    code = nested_script(DEPTH, tail=TAIL)
+    front_end = ParallelFrontEnd(code, workers=run_workers, chunk_size=64).run()
+    front_end.workers = 2
+    errors = front_end.analyze()
+    ast = Parser(Lexer(code, mode='table').tokenize()).parse_ast()
+    assert errors
+    assert errors == SemanticAnalyzer(ast).analyze()
+
+def test_analyze_twice_gives_the_same_errors(nested_script):
+    code = nested_script(10, tail=TAIL)
+    front_end = ParallelFrontEnd(code, workers=2, chunk_size=64).run()
+    errors = SemanticAnalyzer(Parser(Lexer(code, mode='table').tokenize()).parse_ast()).analyze()
+    assert front_end.analyze() == errors
+    assert front_end.analyze() == errors
+    assert front_end.semantic_errors == errors
+
+def test_analyze_in_process_resolves_columns_of_tableless_statements():
+    code = "CREATE TABLE t (a INT, b TEXT);\nSELECT a, b;\n" * 3
+    front_end = ParallelFrontEnd(code, workers=1, chunk_size=16).run()
+    front_end.analyze()
+    ast = Parser(Lexer(code, mode='table').tokenize()).parse_ast()
+    SemanticAnalyzer(ast).analyze()
+    types = [[column.data_type for column in stmt.columns] for stmt in ast.statements[1::2]]
+    assert types == [['INT', 'TEXT']] * 3
+    assert [[column.data_type for column in stmt.columns] for stmt in front_end.statements[1::2]] == types
@@ -0,0 +1,150 @@
+import io
+import random
+import sys
+import tracemalloc
+import pytest
+from ast_nodes import Paren, children
+from compiler import CompilerHandler, encode_json
+from lexer import Lexer
+from parser import Parser, to_parse_tree, tree_lines
+from semantic import SemanticAnalyzer
+
+DEPTH = 100_000
+
+def parse(code):
+    parser = Parser(Lexer(code, mode='table').tokenize())
+    return parser, parser.parse_ast()
+
+def test_parse_deeply_nested_expression(nested_script):
+    parser, ast = parse(nested_script(DEPTH))
+    assert parser.errors == []
+    node, depth = ast.statements[1].where.left, 0
+    while type(node) is Paren:
+        node, depth = node.expr, depth + 1
+    assert depth == DEPTH
+    assert node.name == 'a'
+
+def test_render_deeply_nested_expression(nested_script, tree_depth):
+    parser, ast = parse(nested_script(DEPTH))
+    tree = to_parse_tree(ast)
+    out = io.StringIO()
+    parser.print_tree(tree, file=out, max_depth=50)
+    lines = out.getvalue().splitlines()
+    assert lines[0] == "Query"
+    assert any(line.endswith("└── ...") for line in lines)
+    out = io.StringIO()
+    parser.print_tree(tree, file=out, max_nodes=1000)
+    assert out.getvalue().endswith("... (output cut at 1000 nodes)\n")
+    tree_dict = CompilerHandler.tree_to_dict(tree)
+    assert tree_depth(tree_dict) > 2 * DEPTH
+    table = CompilerHandler.tree_to_table(tree)
+    assert len(table['names']) > 3 * DEPTH
+    assert encode_json(table).startswith('{"names": ["Query", "Statement"')
+
+def test_analyze_deeply_nested_expression(nested_script):
+    _, ast = parse(nested_script(DEPTH, 'c'))
+    analyzer = SemanticAnalyzer(ast)
+    errors = analyzer.analyze()
+    _, shallow = parse(nested_script(1, 'c'))
+    assert errors == SemanticAnalyzer(shallow).analyze()
+    assert errors
+    annotated_tree = analyzer.get_annotated_tree(max_depth=50)
+    assert annotated_tree.count("\n") > 50
+
+def front_end(code):
+    ast = parse(code)[1]
+    to_parse_tree(ast)
+    SemanticAnalyzer(ast).analyze()
+
+def count_calls(function, *args):
+    # Python and C function calls made by function(*args).
+    count = 0
+    def profile(frame, event, arg):
+        nonlocal count
+        if event == 'call' or event == 'c_call':
+            count += 1
+    sys.setprofile(profile)
+    try:
+        function(*args)
+    finally:
+        sys.setprofile(None)
+    return count
+
+def peak_memory(function, *args):
+    tracemalloc.start()
+    try:
+        function(*args)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def test_parse_render_and_analyze_work_grows_linearly_with_nesting(nested_script):
+    # Counted rather than timed: twice the nesting makes at most twice the
+    # calls, and the peak memory grows well short of the quadratic 4x.
+    half, full = nested_script(5000, 'c'), nested_script(10000, 'c')
+    assert count_calls(front_end, full) <= 2 * count_calls(front_end, half)
+    assert peak_memory(front_end, full) < 2.5 * peak_memory(front_end, half)
+
+OPERANDS = ['a', 'b', '1', '2.5', "'s'"]
+OPERATORS = ['+', '-', '*', '/', '%']
+COMPARISONS = ['=', '!=', '<', '>', '<=', '>=']
+
+def random_expression(rng, depth):
+    if depth == 0 or rng.random() < 0.3:
+        return rng.choice(OPERANDS)
+    if rng.random() < 0.2:
+        return f"({random_expression(rng, depth - 1)})"
+    return f"{random_expression(rng, depth - 1)} {rng.choice(OPERATORS)} {random_expression(rng, depth - 1)}"
+
+def random_condition(rng, depth):
+    roll = rng.random()
+    if depth == 0 or roll < 0.3:
+        return f"{random_expression(rng, 2)} {rng.choice(COMPARISONS)} {random_expression(rng, 2)}"
+    if roll < 0.45:
+        return f"NOT {random_condition(rng, depth - 1)}"
+    # Parentheses group expressions only, not conditions.
+    return f"{random_condition(rng, depth - 1)} {rng.choice(['AND', 'OR'])} {random_condition(rng, depth - 1)}"
+
+def operator_mix(seed, corrupted=0.0, statements=200):
+    # Well-formed statements, the given fraction of them with a word dropped
+    # or doubled for the error paths.
+    rng = random.Random(seed)
+    lines = ["CREATE TABLE t (a INT, b TEXT);"]
+    for _ in range(statements):
+        line = rng.choice([
+            f"SELECT a, {random_expression(rng, 3)} FROM t WHERE {random_condition(rng, 3)};",
+            f"UPDATE t SET a = {random_expression(rng, 3)} WHERE {random_condition(rng, 3)};",
+            f"DELETE FROM t WHERE {random_condition(rng, 3)};",
+        ])
+        if rng.random() < corrupted:
+            words = line.split(' ')
+            i = rng.randrange(1, len(words))
+            words[i:i + 1] = [] if rng.random() < 0.5 else [words[i], words[i]]
+            line = ' '.join(words)
+        lines.append(line)
+    return '\n'.join(lines)
+
+def node_spans(ast):
+    spans, stack = [], [ast]
+    while stack:
+        node = stack.pop()
+        spans.append((type(node).__name__, node.span))
+        stack.extend(reversed(list(children(node))))
+    return spans
+
+def assert_parser_modes_agree(code):
+    tokens = Lexer(code, mode='table').tokenize()
+    descent, pratt = Parser(tokens, mode='descent'), Parser(tokens, mode='pratt')
+    descent_ast, pratt_ast = descent.parse_ast(), pratt.parse_ast()
+    assert list(tree_lines(to_parse_tree(pratt_ast))) == list(tree_lines(to_parse_tree(descent_ast)))
+    assert [stmt.span for stmt in pratt_ast.statements] == [stmt.span for stmt in descent_ast.statements]
+    assert node_spans(pratt_ast) == node_spans(descent_ast)
+    assert pratt.errors == descent.errors
+
+def test_parser_modes_agree_on_scripts(sql_path, read_sql):
+    assert_parser_modes_agree(read_sql(sql_path))
+
+@pytest.mark.parametrize('seed', range(3))
+@pytest.mark.parametrize('corrupted', [0.0, 0.05])
+def test_parser_modes_agree_on_operator_mixes(seed, corrupted):
+    assert_parser_modes_agree(operator_mix(seed, corrupted))